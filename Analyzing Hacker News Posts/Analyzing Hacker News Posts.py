@@ -21,8 +21,11 @@
 
 import pandas as pd
 import datetime as dt
+from hn_cache import loadHNFrame
 
-df = pd.read_csv('HN_posts_year_to_Sep_26_2016.csv')
+#The csv file is parsed once into a typed cache (Feather file next to it) with the 'Category'
+#and 'created_epoch' columns, later runs memory-map the cache instead of parsing the csv again
+df = loadHNFrame('HN_posts_year_to_Sep_26_2016.csv')
 print(df.shape)
 df.head()
 
@@ -36,8 +39,10 @@ df.head()
 
 #Filter 'ask hn' and 'show hn' posts
 #'ask hn' are questions from users, 'show hn' are projects being posted
-ask_posts = df['title'].str.lower().str.startswith('ask hn')
-show_posts = df['title'].str.lower().str.startswith('show hn')
+#Each title was classified once into the categorical 'Category' column (Ask HN, Show HN or Other)
+#and 'created_at' parsed once into 'created_epoch' (seconds since 1970, int64) when the cache was built
+ask_posts = df['Category'] == 'Ask HN'
+show_posts = df['Category'] == 'Show HN'
 ask_show_df = df[ask_posts | show_posts ]
 print(ask_show_df.shape)
 ask_show_df.head()
@@ -50,17 +55,13 @@ ask_show_df.head()
 # In[3]:
 
 
-#Create a new column named 'Category' which labels posts as Ask HN or Show HN
-#Create dataframe of Ask HN only posts with the new column:
-ask_df = ask_show_df[ask_show_df['title']
-                             .str.lower()
-                             .str.startswith('ask hn')].assign(Category='Ask HN')
-#Create dataframe of Show HN only posts with the new column:
-show_df = ask_show_df[ask_show_df['title']
-                             .str.lower()
-                             .str.startswith('show hn')].assign(Category='Show HN')
-#Join the two dataframes
-categorized_df = ask_df.append(show_df)
+#The 'Category' column created above already labels posts as Ask HN or Show HN
+#Create dataframe of Ask HN only posts:
+ask_df = df[ask_posts].copy()
+#Create dataframe of Show HN only posts:
+show_df = df[show_posts].copy()
+#Both categories together, dropping the unused 'Other' category
+categorized_df = ask_show_df.assign(Category=ask_show_df['Category'].cat.remove_unused_categories())
 #Group by Category and produce mean:
 mean = categorized_df.groupby('Category').mean()
 print('Average comments:\n\n',mean['num_comments'])
@@ -123,14 +124,11 @@ plt.show()
 
 
 #Find the hour of the day with the most comments for Ask HN posts:
+from hn_engine import HOUR_LABELS, epochHours, localHourLabels
 
-#Convert 'created_at' column into datetime format
-ask_df['created_at'] = pd.to_datetime(ask_df['created_at'],format='%m/%d/%Y %H:%M')
-#Extract just the hour from the 'created_at' column, so a grouping by hour can be done
-hour = ask_df['created_at'].dt.hour
-#'Hour' column created to group by that column, last map() function ignores seconds
-ask_df['Hour'] = pd.to_datetime(hour,format='%H').dt.time.map(lambda t: 
-                                                              t.strftime('%H:%M'))
+#'Hour' column created to group by that column, the hour is taken from the
+#'created_epoch' column parsed at the beginning and labeled as 'HH:00'
+ask_df['Hour'] = HOUR_LABELS[epochHours(ask_df['created_epoch'])]
 #Group by hour
 avg_by_hour = ask_df.groupby('Hour').mean().sort_values(by='num_comments',ascending=False)
 print('Average comments per hour (Eastern Time):\n\n',
@@ -150,18 +148,10 @@ avg_by_local_hour = avg_by_hour.reset_index()
 avg_by_local_hour.rename(columns={'Hour':'Nairobi_Time'},inplace=True)
 
 local_UTC = 3 #Nairobi has a time of UTC+3
+local_abbr, local_name = 'NT', 'Nairobi Time' #Names of the local time in the labels of graphs 2 and 4
 
-#Convert values in avg_by_local_hour['Hour'] to datetime objects:
-avg_by_local_hour['Nairobi_Time'] = pd.to_datetime(avg_by_local_hour['Nairobi_Time'])
-#Eastern time is UTC-5, so data values will get converted back to UTC by adding 5:
-avg_by_local_hour['Nairobi_Time'] = avg_by_local_hour['Nairobi_Time']+dt.timedelta(hours=5)
-#Now add local_UTC to the values:
-avg_by_local_hour['Nairobi_Time'] = avg_by_local_hour['Nairobi_Time']+dt.timedelta(hours=local_UTC)
-
-#Change format of 'Nairobi_Hour' to show only time and ignore seconds
-Nai_hour = avg_by_local_hour['Nairobi_Time'].dt.hour
-avg_by_local_hour['Nairobi_Time'] = pd.to_datetime(Nai_hour,format='%H').dt.time.map(lambda t: 
-                                                              t.strftime('%H:%M'))
+#Eastern time is UTC-5, so the hour labels are moved by 5 to get UTC and then by local_UTC:
+avg_by_local_hour['Nairobi_Time'] = localHourLabels(avg_by_local_hour['Nairobi_Time'],local_UTC)
 #Set index to be the hour:
 avg_by_local_hour.set_index('Nairobi_Time',inplace=True)
 print('Average coments per hour (Nairobi Time):\n\n',
@@ -193,8 +183,8 @@ Etimes = avg_by_hour['num_comments'].head().sort_index()
 Ntimes = avg_by_local_hour['num_comments'].head().sort_index()
 #append values to list
 for h in range(len(avg_by_local_hour['num_comments'].head().index)):
-    labels.append('{} ET\n{} NT'.format(Etimes.index[h],
-                                        Ntimes.index[h]))
+    labels.append('{} ET\n{} {}'.format(Etimes.index[h],
+                                        Ntimes.index[h],local_abbr))
 #Create plot
 ax = sns.catplot(x='Hour', 
                    y='num_comments',
@@ -202,7 +192,7 @@ ax = sns.catplot(x='Hour',
                    data=ask_df_top_hrs,
                    height=5.5,aspect=1.5,jitter=0.3,palette='Dark2_r')
 sns.despine(left=True,bottom=True)
-ax.set_axis_labels('Hour (24hr format) ET=Eastern Time,  NT=Nairobi Time','Number of Comments')
+ax.set_axis_labels('Hour (24hr format) ET=Eastern Time,  {}={}'.format(local_abbr,local_name),'Number of Comments')
 ax.set_xticklabels(labels) #pass the labels list with the two times
 plt.title(GraphTitle('Number of Ask HN Comments in top 5 Hours').getTitle())
 plt.tick_params(axis='both', which='both',length=0)
@@ -252,13 +242,8 @@ plt.show()
 #Find the hour of the day with the most points for Show HN posts:
 #(The show_df dataframe was created at the begining of this project)
 
-#Convert 'created_at' column into datetime format
-show_df['created_at'] = pd.to_datetime(show_df['created_at'],format='%m/%d/%Y %H:%M')
-#Extract just the hour from the 'created_at' column, so a grouping by hour can be done
-hour = show_df['created_at'].dt.hour
-#'Hour' column created to group by that column, last map() function ignores seconds
-show_df['Hour'] = pd.to_datetime(hour,format='%H').dt.time.map(lambda t: 
-                                                              t.strftime('%H:%M'))
+#'Hour' column created to group by that column, taken from the 'created_epoch' column
+show_df['Hour'] = HOUR_LABELS[epochHours(show_df['created_epoch'])]
 #Group by hour
 avgP_by_hour = show_df.groupby('Hour').mean().sort_values(by='num_points',ascending=False)
 print('Average points per hour (Eastern Time):\n\n',
@@ -273,16 +258,9 @@ print('Average points per hour (Eastern Time):\n\n',
 # In[13]:
 
 
-#First create a new column to have the Nairobi Time already available:
-show_df['Nairobi_Time'] = show_df['Hour']
-#Convert the new column to datetime so the timedelta operation can be done
-show_df['Nairobi_Time'] = pd.to_datetime(show_df['Nairobi_Time'])
-#We know now that Nairobi Time equals Eastern Time + 8 hours
-show_df['Nairobi_Time'] = show_df['Nairobi_Time']+dt.timedelta(hours=8)
-#Format the Nairobi Time column to show just the hour and minutes as a string
-Nai_hour = show_df['Nairobi_Time'].dt.hour
-show_df['Nairobi_Time'] = pd.to_datetime(Nai_hour,format='%H').dt.time.map(lambda t: 
-                                                              t.strftime('%H:%M'))
+#First create a new column to have the Nairobi Time already available.
+#We know now that Nairobi Time equals Eastern Time + 8 hours (UTC+3)
+show_df['Nairobi_Time'] = localHourLabels(show_df['Hour'],local_UTC)
 show_df.head(3)
 
 
@@ -308,8 +286,8 @@ Etimes = show_df_top_hrs['Hour'].unique()
 Ntimes = show_df_top_hrs['Nairobi_Time'].unique()
 #append values to list
 for h in range(len(avg_by_local_hour['num_comments'].head().index)):
-    labels.append('{} ET\n{} NT'.format(Etimes[h],
-                                        Ntimes[h]))
+    labels.append('{} ET\n{} {}'.format(Etimes[h],
+                                        Ntimes[h],local_abbr))
 #Create plot
 ax = sns.catplot(x='Hour', 
                    y='num_points',
@@ -317,7 +295,7 @@ ax = sns.catplot(x='Hour',
                    data=show_df_top_hrs,
                    height=5.5,aspect=1.5,jitter=0.3,palette='Dark2_r')
 sns.despine(left=True,bottom=True)
-ax.set_axis_labels('Hour (24hr format) ET=Eastern Time,  NT=Nairobi Time','Number of Points')
+ax.set_axis_labels('Hour (24hr format) ET=Eastern Time,  {}={}'.format(local_abbr,local_name),'Number of Points')
 ax.set_xticklabels(labels) #pass the labels list with the two times
 plt.title(GraphTitle('Number of Show HN Points in top 5 Hours').getTitle())
 plt.tick_params(axis='both', which='both',length=0)
@@ -333,13 +311,11 @@ plt.show()
 # In[16]:
 
 
-other_df = df[~ask_posts | ~show_posts] #Use the ~ to indicate this variables are excluded
+other_df = df[~(ask_posts | show_posts)] #Use the ~ to indicate this variables are excluded
 
-#Create a 'Category' column were all comments are labeled as 'Other'
-other_df['Category'] = 'Other'
-
-#Append this to the 'categorized_df' dataframe created before
-new_categorized_df = categorized_df.append(other_df)
+#The 'Category' column already labels this posts as 'Other',
+#so the full dataframe holds the three categories
+new_categorized_df = df
 #Group by category and produce mean:
 mean = new_categorized_df.groupby('Category').mean()
 print('Average comments:\n\n',mean['num_comments'])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Benchmark of the post categorization.
+
+Compares the original path of the script (lowercasing the whole 'title' column
+four times and appending dataframes) with categorizeTitles(), which classifies
+each title once into a categorical 'Category' column.
+
+Usage:
+    python bench_categorize.py                        #synthetic titles
+    python bench_categorize.py HN_posts_year_to_Sep_26_2016.csv
+'''
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from hn_engine import categorizeTitles
+
+
+def syntheticPosts(n, seed=0):
+    '''Returns a dataframe of n posts with a mix of Ask HN, Show HN and other titles.'''
+    rng = np.random.default_rng(seed)
+    prefixes = np.array(['Ask HN: ', 'Show HN: ', 'ASK HN ', 'show hn - ', '', '', '', ''])
+    titles = np.char.add(rng.choice(prefixes, n), 'a title about something number ')
+    return pd.DataFrame({'title': titles,
+                         'num_points': rng.poisson(15, n),
+                         'num_comments': rng.poisson(7, n)})
+
+
+def oldPath(df):
+    '''Categorization as originally done in the script.
+    DataFrame.append is gone from recent pandas, pd.concat does the same copy.'''
+    ask_posts = df['title'].str.lower().str.startswith('ask hn')
+    show_posts = df['title'].str.lower().str.startswith('show hn')
+    ask_show_df = df[ask_posts | show_posts]
+    ask_df = ask_show_df[ask_show_df['title'].str.lower()
+                         .str.startswith('ask hn')].assign(Category='Ask HN')
+    show_df = ask_show_df[ask_show_df['title'].str.lower()
+                          .str.startswith('show hn')].assign(Category='Show HN')
+    categorized_df = pd.concat([ask_df, show_df])
+    other_df = df[~(ask_posts | show_posts)].assign(Category='Other')
+    new_categorized_df = pd.concat([categorized_df, other_df])
+    return new_categorized_df.groupby('Category')[['num_points', 'num_comments']].mean()
+
+
+def newPath(df):
+    '''Categorization with a single pass over the titles.'''
+    df = df.assign(Category=categorizeTitles(df['title']))
+    return df.groupby('Category', observed=True)[['num_points', 'num_comments']].mean()
+
+
+def best(func, df, repeat):
+    '''Returns the result of func(df) and its best time out of repeat runs.'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(df)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the post categorization')
+    parser.add_argument('path', nargs='?', help='csv file with the Hacker News posts')
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='number of synthetic posts when no file is given')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.path:
+        df = pd.read_csv(args.path, usecols=['title', 'num_points', 'num_comments'])
+    else:
+        df = syntheticPosts(args.rows)
+
+    old, old_time = best(oldPath, df, args.repeat)
+    new, new_time = best(newPath, df, args.repeat)
+    same = np.allclose(old.loc[new.index.astype(str)].values, new.values)
+    print('Posts: {:,}'.format(len(df)))
+    print('Old path: {:.3f} s'.format(old_time))
+    print('New path: {:.3f} s ({:.1f}x)'.format(new_time, old_time / new_time))
+    print('Same averages:', same)
+
+
+if __name__ == '__main__':
+    main()
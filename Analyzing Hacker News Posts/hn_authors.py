@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Author-level engagement index for the Hacker News posts.
+
+The 'author' column is dictionary-encoded (an integer id per author) and a
+single build pass keeps, for every author, the number of posts and the sums of
+'num_points' and 'num_comments' per category (Ask HN, Show HN, Other) and hour
+of the day. Questions like "top 10 authors by average comments on Ask HN posts
+made at 15:00" are then answered from those aggregates, without going back to
+the posts.
+
+Usage:
+    from hn_cache import loadHNFrame
+    from hn_authors import AuthorIndex
+    index = AuthorIndex(loadHNFrame('HN_posts_year_to_Sep_26_2016.csv'))
+    index.topK(10, 'num_comments', category='Ask HN', hour=15, min_posts=3)
+'''
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from hn_engine import CATEGORIES, METRICS, epochHours
+
+CELLS = len(CATEGORIES) * 24 #One cell per (category, hour)
+
+
+class AuthorIndex():
+    '''Per-author running aggregates of a typed frame (see hn_cache.typedChunk()).
+
+    Two structures are kept:
+    - dense (category, author) totals, for questions about a whole category;
+    - sparse (category, hour, author) aggregates, sorted by cell so the authors
+      of one (category, hour) are a contiguous slice.'''
+
+    def __init__(self, frame):
+        '''frame = dataframe with 'author', 'Category', 'created_epoch' and the METRICS columns.
+        Posts without an author are left out.'''
+        if isinstance(frame['author'].dtype, pd.CategoricalDtype):
+            author_ids = frame['author'].cat.codes.values.astype(np.int64)
+            self.authors = np.asarray(frame['author'].cat.categories)
+        else:
+            author_ids, self.authors = pd.factorize(frame['author'], sort=True)
+            self.authors = np.asarray(self.authors)
+        #Missing authors get the code -1, or the '' of hn_cache.typedChunk()
+        known = (author_ids >= 0) & ~np.isin(author_ids, np.flatnonzero(self.authors == ''))
+        if not known.all():
+            frame, author_ids = frame[known], author_ids[known]
+        self.author_ids = {name: i for i, name in enumerate(self.authors)}
+        n = max(len(self.authors), 1) #Key width, also for an empty frame
+        self.width = n
+
+        cell = (frame['Category'].cat.codes.values.astype(np.int64) * 24
+                + epochHours(frame['created_epoch'].values))
+        values = frame[METRICS].values.astype(np.float64)
+
+        #Sparse aggregates per (cell, author), the key sorts by cell first
+        keys, inverse = np.unique(cell * n + author_ids, return_inverse=True)
+        self.keys = keys
+        self.counts = np.bincount(inverse, minlength=len(keys))
+        self.sums = np.column_stack([np.bincount(inverse, weights=values[:, i], minlength=len(keys))
+                                     for i in range(len(METRICS))])
+        self.cell_starts = np.searchsorted(keys // n, np.arange(CELLS + 1))
+
+        #Dense totals per (category, author)
+        category_key = (cell // 24) * n + author_ids
+        size = len(CATEGORIES) * n
+        self.category_counts = np.bincount(category_key, minlength=size).reshape(-1, n)[:, :self.size]
+        self.category_sums = np.stack([np.bincount(category_key, weights=values[:, i], minlength=size)
+                                       .reshape(-1, n) for i in range(len(METRICS))], axis=-1)[:, :self.size]
+
+    @property
+    def size(self):
+        '''Number of authors in the index.'''
+        return len(self.authors)
+
+    def _cells(self, category, hour):
+        '''Returns the list of (category, hour) cells of a query.'''
+        categories = range(len(CATEGORIES)) if category is None else [CATEGORIES.index(category)]
+        return [c * 24 + hour for c in categories]
+
+    def _aggregates(self, category=None, hour=None):
+        '''Returns the post counts and metric sums of every author for a query.'''
+        if category is not None and category not in CATEGORIES:
+            raise ValueError('category must be one of {}'.format(CATEGORIES))
+        if hour is not None and not (isinstance(hour, (int, np.integer)) and 0 <= hour < 24):
+            raise ValueError('hour must be an integer from 0 to 23, not {!r}'.format(hour))
+        if hour is None:
+            if category is None:
+                return self.category_counts.sum(axis=0), self.category_sums.sum(axis=0)
+            row = CATEGORIES.index(category)
+            return self.category_counts[row], self.category_sums[row]
+        counts = np.zeros(self.size, dtype=np.int64)
+        sums = np.zeros((self.size, len(METRICS)))
+        for cell in self._cells(category, hour):
+            start, end = self.cell_starts[cell], self.cell_starts[cell + 1]
+            authors = self.keys[start:end] % self.width
+            counts[authors] += self.counts[start:end]
+            sums[authors] += self.sums[start:end]
+        return counts, sums
+
+    def topK(self, k=10, metric='num_comments', category=None, hour=None, min_posts=1):
+        '''k = number of authors, metric = 'num_comments' or 'num_points',
+        category = one of CATEGORIES (all by default), hour = 0 to 23 (all by default),
+        min_posts = authors with fewer posts in the selection are ignored.
+        Returns a dataframe with the k authors with the highest average metric.'''
+        if metric not in METRICS:
+            raise ValueError('metric must be one of {}'.format(METRICS))
+        counts, sums = self._aggregates(category, hour)
+        candidates = np.flatnonzero(counts >= max(min_posts, 1))
+        averages = sums[candidates, METRICS.index(metric)] / counts[candidates]
+        if len(candidates) > k:
+            #Linear-time selection of the k best, only those k are sorted
+            best = np.argpartition(-averages, k - 1)[:k]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.lexsort((candidates[best], -averages[best]))]
+        winners = candidates[best]
+        return pd.DataFrame({'author': self.authors[winners],
+                             'posts': counts[winners],
+                             'avg_' + metric: averages[best]},
+                            index=pd.RangeIndex(1, len(winners) + 1, name='Rank'))
+
+    def authorStats(self, author):
+        '''Returns a dataframe with the posts and averages of one author per category.'''
+        i = self.author_ids[author]
+        counts = self.category_counts[:, i]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.category_sums[:, i] / counts[:, None]
+        table = pd.DataFrame(means, index=pd.Index(CATEGORIES, name='Category'), columns=METRICS)
+        table.insert(0, 'posts', counts)
+        return table[table['posts'] > 0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Top Hacker News authors by engagement')
+    parser.add_argument('path', help='csv file with the Hacker News posts')
+    parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--metric', choices=METRICS, default='num_comments')
+    parser.add_argument('--category', choices=CATEGORIES, default=None)
+    parser.add_argument('--hour', type=int, choices=range(24), default=None, metavar='{0..23}',
+                        help='hour of the day, Eastern Time')
+    parser.add_argument('--min-posts', type=int, default=1)
+    args = parser.parse_args()
+
+    from hn_cache import loadHNFrame
+    index = AuthorIndex(loadHNFrame(args.path))
+    print(index.topK(args.k, args.metric, args.category, args.hour, args.min_posts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Columnar cache of the parsed Hacker News dataset.
+
+The first run parses the csv file once and saves the typed and categorized
+frame in a columnar file (Feather by default, Parquet optionally):
+
+- 'id': int64
+- 'Category': Ask HN, Show HN or Other (dictionary-encoded)
+- 'created_epoch': seconds since 1970 (int64, Eastern Time wall clock)
+- 'num_points', 'num_comments': int32
+- 'author': dictionary-encoded
+
+Later runs memory-map that file instead of parsing the csv again: the
+dataframe of readCache() is a set of read-only views of the mapped Feather
+file, no column is copied (readTable() gives the Arrow table itself). A small json
+file next to the cache keeps the size, modification time and sha256 of the
+source file, and the cache is rebuilt when any of them changes.
+
+Usage:
+    from hn_cache import loadHNFrame
+    df = loadHNFrame('HN_posts_year_to_Sep_26_2016.csv')
+'''
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from hn_engine import CATEGORIES, categorizeTitles, parseCreatedAt
+
+CACHE_VERSION = 1 #Change it when the cached columns change
+SOURCE_COLS = ['id', 'title', 'num_points', 'num_comments', 'author', 'created_at']
+FORMATS = {'feather': '.feather', 'parquet': '.parquet'}
+
+
+def fileHash(path, block_size=1 << 20):
+    '''Returns the sha256 of a file, read in blocks of block_size bytes.'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def sourceStamp(path, with_hash=True):
+    '''Returns a dict with the size, modification time and (optionally) hash of path.'''
+    stat = os.stat(path)
+    stamp = {'version': CACHE_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if with_hash:
+        stamp['sha256'] = fileHash(path)
+    return stamp
+
+
+def typedChunk(chunk):
+    '''chunk = dataframe with the SOURCE_COLS columns.
+    Returns the typed and categorized frame that goes into the cache.'''
+    return pd.DataFrame({
+        'id': chunk['id'].values.astype(np.int64),
+        'Category': categorizeTitles(chunk['title']).values,
+        'created_epoch': parseCreatedAt(chunk['created_at']),
+        'num_points': chunk['num_points'].values.astype(np.int32),
+        'num_comments': chunk['num_comments'].values.astype(np.int32),
+        'author': pd.Categorical(chunk['author'].fillna('')),
+    })
+
+
+def buildHNFrame(path, chunksize=500000):
+    '''Parses the csv file in chunks (titles and urls are dropped as soon as
+    each chunk is categorized). Returns the typed frame.'''
+    chunks = [typedChunk(c) for c in pd.read_csv(path, usecols=SOURCE_COLS,
+                                                  chunksize=chunksize)]
+    if not chunks:
+        return typedChunk(pd.DataFrame({c: [] for c in SOURCE_COLS}))
+    authors = union_categoricals([c['author'].values for c in chunks])
+    frame = pd.concat([c.drop(columns='author') for c in chunks], ignore_index=True)
+    frame['author'] = authors
+    return frame
+
+
+def cachePaths(path, cache_path=None, fmt='feather'):
+    '''Returns the cache file and its json stamp file.
+    By default the cache sits next to the csv file with the format extension.'''
+    if cache_path is None:
+        cache_path = os.path.splitext(path)[0] + FORMATS[fmt]
+    return cache_path, cache_path + '.json'
+
+
+def writeCache(frame, cache_path, fmt='feather'):
+    '''Saves the typed frame. Feather files are left uncompressed so they can be memory-mapped.'''
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if fmt == 'feather':
+        feather.write_feather(table, cache_path, compression='uncompressed')
+    else:
+        pq.write_table(table, cache_path)
+
+
+def readTable(cache_path, fmt='feather'):
+    '''Returns the cache as an Arrow table. A Feather cache is memory-mapped:
+    the columns point into the mapped file and pages are only read when used.
+    A Parquet cache is decoded into memory (its pages are encoded).'''
+    if fmt == 'feather':
+        return feather.read_table(cache_path, memory_map=True)
+    return pq.read_table(cache_path, memory_map=True)
+
+
+def readCache(cache_path, fmt='feather'):
+    '''Returns the cache as a dataframe. The columns are not consolidated
+    (split_blocks) and the table is released as it is converted
+    (self_destruct), so with Feather the numeric columns and the codes of the
+    dictionary-encoded 'Category' and 'author' stay zero-copy, read-only views
+    of the mapped file.'''
+    frame = readTable(cache_path, fmt).to_pandas(split_blocks=True, self_destruct=True)
+    if list(frame['Category'].cat.categories) != CATEGORIES:
+        frame['Category'] = frame['Category'].cat.set_categories(CATEGORIES)
+    return frame
+
+
+def cacheIsValid(path, stamp_path, verify_hash=False):
+    '''Compares the saved stamp with the source file.
+    Size and modification time are checked first, the hash is only computed when
+    the modification time changed (or verify_hash is True): a file that was
+    touched but not modified keeps its cache and gets a new stamp.'''
+    if not os.path.exists(stamp_path):
+        return False
+    with open(stamp_path) as f:
+        saved = json.load(f)
+    current = sourceStamp(path, with_hash=False)
+    if saved.get('version') != CACHE_VERSION or saved.get('size') != current['size']:
+        return False
+    if saved.get('mtime_ns') == current['mtime_ns'] and not verify_hash:
+        return True
+    if saved.get('sha256') != fileHash(path):
+        return False
+    saved['mtime_ns'] = current['mtime_ns']
+    with open(stamp_path, 'w') as f:
+        json.dump(saved, f)
+    return True
+
+
+def loadHNFrame(path, cache_path=None, fmt='feather', verify_hash=False, rebuild=False):
+    '''path = csv file, cache_path = cache file (next to the csv by default),
+    fmt = 'feather' or 'parquet', verify_hash = always compare the source hash,
+    rebuild = ignore the current cache.
+    Returns the typed frame, from the cache when it is up to date.'''
+    if fmt not in FORMATS:
+        raise ValueError('fmt must be one of {}'.format(list(FORMATS)))
+    cache_path, stamp_path = cachePaths(path, cache_path, fmt)
+    if (not rebuild and os.path.exists(cache_path)
+            and cacheIsValid(path, stamp_path, verify_hash)):
+        return readCache(cache_path, fmt)
+
+    stamp = sourceStamp(path)
+    frame = buildHNFrame(path)
+    writeCache(frame, cache_path, fmt)
+    with open(stamp_path, 'w') as f:
+        json.dump(stamp, f)
+    return readCache(cache_path, fmt)
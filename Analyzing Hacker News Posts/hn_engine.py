@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Streaming engine for the Hacker News posts analysis.
+
+"Analyzing Hacker News Posts.py" loads the whole csv file in memory before
+filtering it. This module reads the file in chunks and keeps only what the
+analysis needs: the number of posts and the sums of 'num_points' and
+'num_comments' for each category (Ask HN, Show HN, Other) and each hour of the
+day. The partial results of every chunk are merged at the end, so memory use
+stays flat no matter how big the dump is.
+
+Dumps split in several files (e.g. one per month) are processed in parallel,
+one file per worker process, and their partial results merged the same way.
+
+Usage:
+    python hn_engine.py HN_posts_year_to_Sep_26_2016.csv --chunksize 100000
+    python hn_engine.py "dumps/HN_posts_*.csv" --workers 32
+'''
+
+import argparse
+import datetime as dt
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ['Ask HN', 'Show HN', 'Other']
+METRICS = ['num_points', 'num_comments']
+#Only these columns are parsed, 'url' and 'author' are never loaded
+USECOLS = ['title', 'num_points', 'num_comments', 'created_at']
+DATE_FORMAT = '%m/%d/%Y %H:%M' #Format of the 'created_at' column (Eastern Time)
+SOURCE_TZ = 'America/New_York' #Time zone of the 'created_at' column
+SOURCE_UTC = -5 #Eastern time offset used by the notebook for plain UTC offsets
+HOUR_LABELS = np.array(['{:02d}:00'.format(h) for h in range(24)])
+LABEL_HOURS = {label: h for h, label in enumerate(HOUR_LABELS)}
+
+
+def categoryCodes(titles):
+    '''titles = Series of post titles.
+    Returns an int8 array with the position in CATEGORIES of each title.
+    Only the first 7 characters of each title are lowercased, once.'''
+    prefix = titles.str.slice(0, 7).str.lower()
+    codes = np.full(len(prefix), 2, dtype=np.int8) #Everything is 'Other' by default
+    codes[prefix.str.startswith('ask hn', na=False).values] = 0
+    codes[(prefix == 'show hn').values] = 1
+    return codes
+
+
+def categorizeTitles(titles):
+    '''titles = Series of post titles.
+    Returns a categorical Series (Ask HN, Show HN, Other) with the same index,
+    to be used as the 'Category' column in every later grouping.'''
+    return pd.Series(pd.Categorical.from_codes(categoryCodes(titles), CATEGORIES),
+                     index=titles.index, name='Category')
+
+
+def parseCreatedAt(created_at):
+    '''created_at = Series of dates as they appear in the csv file.
+    Returns an int64 array of seconds since 1970-01-01 (Eastern Time wall clock).
+    This is the only place the dates are parsed, everything else uses the epoch.'''
+    parsed = pd.to_datetime(created_at, format=DATE_FORMAT)
+    return parsed.values.astype('datetime64[s]').astype(np.int64)
+
+
+def epochHours(epoch):
+    '''epoch = array of seconds from parseCreatedAt().
+    Returns an array with the hour of the day (0 to 23) of each post.'''
+    return (np.asarray(epoch) // 3600) % 24
+
+
+def localHourLabels(labels, local_utc, source_utc=SOURCE_UTC, when=None):
+    '''labels = 'HH:00' hour labels in Eastern Time, local_utc = UTC offset in hours
+    or time zone name (resolved at when, see zoneShift()).
+    Returns the labels moved to the local time, e.g. '15:00' becomes '23:00' for UTC+3.'''
+    hours = np.array([LABEL_HOURS[label] for label in labels], dtype=int)
+    if isinstance(local_utc, str):
+        shift = zoneShift(local_utc, when)
+    else:
+        shift = round((local_utc - source_utc) * 60)
+    minutes = hours * 60 + shift
+    return np.array(['{:02d}:{:02d}'.format(m // 60 % 24, m % 60) for m in minutes])
+
+
+def zoneShift(tz, when=None):
+    '''tz = UTC offset in hours (int or float) or IANA time zone name ('Africa/Nairobi').
+    when = datetime used to resolve daylight saving time (now by default).
+    Returns the number of minutes to add to Eastern Time to get the local time.
+    Plain offsets are measured against SOURCE_UTC, like the notebook does,
+    zone names against SOURCE_TZ at that single moment: posts from the other
+    side of a daylight saving change get the wrong offset (see zoneMinutes()
+    for the offset of each post).'''
+    if isinstance(tz, (int, float)):
+        return int(round((tz - SOURCE_UTC) * 60))
+    when = when or dt.datetime.now(dt.timezone.utc)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt.timezone.utc)
+    local = when.astimezone(ZoneInfo(tz)).utcoffset()
+    source = when.astimezone(ZoneInfo(SOURCE_TZ)).utcoffset()
+    return int((local - source).total_seconds() // 60)
+
+
+def zoneMinutes(epoch, tz):
+    '''epoch = seconds from parseCreatedAt() (Eastern Time wall clock), tz as in zoneShift().
+    Returns the minutes to add to the Eastern Time of each post to get its
+    local time. Zone names are resolved at the moment of each post, with the
+    daylight saving time of both zones; plain offsets are fixed, as in zoneShift().
+    Only the distinct hours are converted.'''
+    epoch = np.asarray(epoch, dtype=np.int64)
+    if isinstance(tz, (int, float)):
+        return np.full(len(epoch), zoneShift(tz), dtype=np.int64)
+    hours, inverse = np.unique(epoch // 3600, return_inverse=True)
+    wall = pd.DatetimeIndex((hours * 3600).astype('datetime64[s]'))
+    #Repeated hour of the fall change and missing hour of the spring change: standard time
+    source = wall.tz_localize(SOURCE_TZ, ambiguous=np.zeros(len(wall), dtype=bool), nonexistent='shift_backward')
+    local = source.tz_convert(tz).tz_localize(None)
+    shift = (local.values - source.tz_localize(None).values) // np.timedelta64(1, 'm')
+    return shift.astype(np.int64)[inverse.ravel()]
+
+
+def localHourBins(epoch, tz):
+    '''epoch and tz as in zoneMinutes(). Returns the local hour bin (0 to 23)
+    of each post, i.e. the local time of the start of its Eastern hour, and
+    the minutes of the bin labels ('HH:30' for zones half an hour apart).'''
+    shift = zoneMinutes(epoch, tz)
+    bins = (epochHours(epoch) * 60 + shift) // 60 % 24
+    minutes = int(np.bincount(shift % 60).argmax()) if len(shift) else zoneShift(tz) % 60
+    return bins, minutes
+
+
+def epochMoment(epoch):
+    '''Returns the UTC datetime of an Eastern Time wall clock epoch.'''
+    moment = pd.Timestamp(int(epoch), unit='s').tz_localize(SOURCE_TZ, ambiguous=False,
+                                                            nonexistent='shift_backward')
+    return moment.tz_convert('UTC').to_pydatetime()
+
+
+def rotateHourBins(bins, tz, when=None):
+    '''bins = array with 24 hour-of-day bins in Eastern Time on its last axis,
+    tz and when as in zoneShift().
+    Returns the bins rotated to the local time and their 'HH:MM' labels.
+    No row is touched: converting to another zone is a roll of the 24 bins.'''
+    shift = zoneShift(tz, when)
+    hours, minutes = divmod(shift, 60)
+    labels = np.array(['{:02d}:{:02d}'.format(h, minutes) for h in range(24)])
+    return np.roll(bins, hours, axis=-1), labels
+
+
+class HNStats():
+    '''Mergeable partial aggregates of a set of Hacker News posts.
+    Keeps the number of posts and the sums (and sums of squares) of each metric
+    per category and hour of the day. Each chunk (or file) produces its own
+    HNStats and they are combined with merge().
+
+    The hours are Eastern Time. For the time zone names given in zones, the
+    posts are also binned by their own local hour (converted post by post,
+    daylight saving time included), and hourMeans() uses those bins. Other
+    zones are answered by rotating the Eastern Time bins by the offset at the
+    middle of the time range of the posts, which is off by an hour for the
+    posts on the other side of a daylight saving change.'''
+
+    def __init__(self, zones=()):
+        shape = (len(CATEGORIES), 24)
+        self.counts = np.zeros(shape, dtype=np.int64)
+        self.sums = np.zeros(shape + (len(METRICS),))
+        self.sumsq = np.zeros(shape + (len(METRICS),))
+        self.first_epoch = None #Time range of the posts (Eastern Time epoch)
+        self.last_epoch = None
+        #Zone name -> [counts, sums, minutes of the labels] per category and local hour
+        self.zones = {tz: [np.zeros(shape, dtype=np.int64), np.zeros(shape + (len(METRICS),)), 0]
+                      for tz in dict.fromkeys(zones) if isinstance(tz, str)}
+
+    def _addRange(self, first, last):
+        if first is None:
+            return
+        self.first_epoch = first if self.first_epoch is None else min(self.first_epoch, first)
+        self.last_epoch = last if self.last_epoch is None else max(self.last_epoch, last)
+
+    def _addZoneBins(self, codes, epoch, posts, sums):
+        '''codes, epoch = category and Eastern Time epoch of each row, posts =
+        number of posts of each row, sums = (rows, metrics) sums of each row.
+        Adds the rows to the local hour bins of every zone.'''
+        size = len(CATEGORIES) * 24
+        for tz, (counts, zone_sums, _) in self.zones.items():
+            hours, minutes = localHourBins(epoch, tz)
+            key = codes.astype(np.intp) * 24 + hours
+            counts += np.bincount(key, weights=posts, minlength=size).astype(np.int64).reshape(counts.shape)
+            for i in range(len(METRICS)):
+                zone_sums[:, :, i] += np.bincount(key, weights=sums[:, i], minlength=size).reshape(counts.shape)
+            if len(epoch):
+                self.zones[tz][2] = minutes
+
+    def middleTime(self):
+        '''Returns the UTC datetime in the middle of the time range of the posts, or None.'''
+        if self.first_epoch is None:
+            return None
+        return epochMoment((self.first_epoch + self.last_epoch) // 2)
+
+    def update(self, chunk):
+        '''chunk = dataframe with the USECOLS columns, or with 'Category' and
+        'created_epoch' columns already computed. Returns self.'''
+        if 'Category' in chunk:
+            codes = chunk['Category'].cat.codes.values
+        else:
+            codes = categoryCodes(chunk['title'])
+        if 'created_epoch' in chunk:
+            epoch = chunk['created_epoch'].values
+        else:
+            epoch = parseCreatedAt(chunk['created_at'])
+        key = codes.astype(np.intp) * 24 + epochHours(epoch)
+        size = len(CATEGORIES) * 24
+        self.counts += np.bincount(key, minlength=size).reshape(self.counts.shape)
+        for i, metric in enumerate(METRICS):
+            values = chunk[metric].values.astype(np.float64)
+            self.sums[:, :, i] += np.bincount(key, weights=values,
+                                              minlength=size).reshape(self.counts.shape)
+            self.sumsq[:, :, i] += np.bincount(key, weights=values * values,
+                                               minlength=size).reshape(self.counts.shape)
+        if len(epoch):
+            self._addRange(int(epoch.min()), int(epoch.max()))
+            if self.zones:
+                values = np.stack([chunk[m].values.astype(np.float64) for m in METRICS], axis=1)
+                self._addZoneBins(codes, epoch, np.ones(len(epoch)), values)
+        return self
+
+    def merge(self, other):
+        '''Adds the aggregates of another HNStats to this one. Returns self.
+        Only the zones binned in both keep their local hour bins.'''
+        self.counts += other.counts
+        self.sums += other.sums
+        self.sumsq += other.sumsq
+        self._addRange(other.first_epoch, other.last_epoch)
+        for tz in list(self.zones):
+            if tz not in other.zones:
+                del self.zones[tz]
+                continue
+            counts, sums, minutes = other.zones[tz]
+            self.zones[tz][0] += counts
+            self.zones[tz][1] += sums
+            if counts.any():
+                self.zones[tz][2] = minutes
+        return self
+
+    def categoryMeans(self, categories=CATEGORIES):
+        '''Returns a dataframe with the average of each metric per category,
+        same as grouping the posts by 'Category' and calling mean().'''
+        rows = [CATEGORIES.index(c) for c in categories]
+        counts = self.counts[rows].sum(axis=1)
+        sums = self.sums[rows].sum(axis=1)
+        keep = counts > 0
+        return pd.DataFrame(sums[keep] / counts[keep, None],
+                            index=pd.Index(np.array(categories)[keep], name='Category'),
+                            columns=METRICS)
+
+    def hourMeans(self, category, sort_by, tz=None, when=None):
+        '''category = one of CATEGORIES, sort_by = metric to rank the hours,
+        tz = local time zone as in zoneShift() (Eastern Time by default),
+        when = moment of the offset for the zones not binned post by post
+        (the middle of the time range of the posts by default).
+        Returns a dataframe with the average of each metric per hour ('HH:MM'),
+        sorted in descending order, same as avg_by_hour in the script.'''
+        row = CATEGORIES.index(category)
+        counts, sums, labels = self.counts[row], self.sums[row].T, HOUR_LABELS
+        if tz in self.zones and when is None:
+            zone_counts, zone_sums, minutes = self.zones[tz]
+            counts, sums = zone_counts[row], zone_sums[row].T
+            labels = np.array(['{:02d}:{:02d}'.format(h, minutes) for h in range(24)])
+        elif tz is not None:
+            when = when or self.middleTime()
+            counts, labels = rotateHourBins(counts, tz, when)
+            sums, labels = rotateHourBins(sums, tz, when)
+        keep = counts > 0
+        means = pd.DataFrame(sums.T[keep] / counts[keep, None],
+                             index=pd.Index(labels[keep], name='Hour'),
+                             columns=METRICS)
+        return means.sort_values(by=sort_by, ascending=False, kind='mergesort')
+
+    def bestHours(self, zones, category='Ask HN', sort_by='num_comments', when=None):
+        '''zones = list of UTC offsets or time zone names.
+        Returns a dataframe with the best local hour to post in each zone
+        and its average, from the local hour bins of the zones given to HNStats
+        and from the rotated Eastern Time bins for the others.'''
+        rows = []
+        for tz in zones:
+            means = self.hourMeans(category, sort_by, tz, when)
+            rows.append((means.index[0], means[sort_by].iloc[0]))
+        return pd.DataFrame(rows, index=pd.Index([str(tz) for tz in zones], name='Zone'),
+                            columns=['Hour', sort_by])
+
+
+def hnStats(df, zones=()):
+    '''In-memory path: returns the HNStats of a dataframe already loaded.
+    zones = time zone names binned post by post (see HNStats).'''
+    return HNStats(zones).update(df)
+
+
+def streamHNStats(path, chunksize=100000, zones=()):
+    '''path = csv file, chunksize = number of rows read at a time, zones as in hnStats().
+    Returns the HNStats of the whole file without loading it in memory.'''
+    stats = HNStats(zones)
+    for chunk in pd.read_csv(path, usecols=USECOLS, chunksize=chunksize):
+        stats.update(chunk)
+    return stats
+
+
+def fileStats(path, chunksize=100000, cache=False, zones=()):
+    '''Returns the HNStats of one file, streamed or from the columnar cache.
+    Runs in the worker processes of parallelHNStats().'''
+    if cache:
+        from hn_cache import loadHNFrame
+        return hnStats(loadHNFrame(path), zones)
+    return streamHNStats(path, chunksize, zones)
+
+
+def expandPaths(patterns):
+    '''patterns = file names or glob patterns ('dumps/HN_posts_*.csv').
+    Returns the sorted list of matching files without repetitions.'''
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern)
+        if not matches and not glob.has_magic(pattern):
+            matches = [pattern] #Let pandas raise the usual error for a missing file
+        paths.update(matches)
+    return sorted(paths)
+
+
+def parallelHNStats(patterns, workers=None, chunksize=100000, cache=False, zones=()):
+    '''patterns = list of files or glob patterns, workers = number of processes
+    (one per cpu by default), chunksize, cache and zones as in fileStats().
+    Each file is aggregated in its own process and the partial HNStats are merged.
+    Returns the merged HNStats.'''
+    paths = expandPaths(patterns)
+    if not paths:
+        raise FileNotFoundError('No files match {}'.format(patterns))
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    stats = HNStats(zones)
+    if workers == 1:
+        for path in paths:
+            stats.merge(fileStats(path, chunksize, cache, zones))
+        return stats
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(fileStats, paths, [chunksize] * len(paths), [cache] * len(paths),
+                                [zones] * len(paths)):
+            stats.merge(partial)
+    return stats
+
+
+def printReport(stats, local_utc=3):
+    '''Prints the same results "Analyzing Hacker News Posts.py" prints.
+    local_utc = UTC offset or time zone name of the local time (Nairobi is UTC+3).'''
+    mean = stats.categoryMeans(['Ask HN', 'Show HN'])
+    print('Average comments:\n\n', mean['num_comments'])
+
+    avg_by_hour = stats.hourMeans('Ask HN', 'num_comments')
+    print('Average comments per hour (Eastern Time):\n\n',
+          avg_by_hour['num_comments'].head().map('average {:,.2f} comments per post.'.format))
+
+    avg_by_local_hour = stats.hourMeans('Ask HN', 'num_comments', local_utc)
+    print('Average comments per hour ({}):\n\n'.format(zoneName(local_utc)),
+          avg_by_local_hour['num_comments'].head().map('average {:,.2f} comments per post.'.format))
+
+    print('Average points:\n\n', mean['num_points'])
+
+    avgP_by_hour = stats.hourMeans('Show HN', 'num_points')
+    print('Average points per hour (Eastern Time):\n\n',
+          avgP_by_hour['num_points'].head().map('average {:,.2f} points per post.'.format))
+
+    mean = stats.categoryMeans()
+    print('Average comments:\n\n', mean['num_comments'])
+
+
+def zoneName(tz):
+    '''Returns 'UTC+3' for plain offsets and the name itself for time zone names.'''
+    if isinstance(tz, (int, float)):
+        return 'UTC{:+g}'.format(tz)
+    return tz
+
+
+def parseZone(text):
+    '''Command line zones: numbers are UTC offsets, anything else a time zone name.'''
+    try:
+        return float(text) if '.' in text else int(text)
+    except ValueError:
+        return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming Hacker News posts analysis')
+    parser.add_argument('paths', nargs='+',
+                        help='csv files (or glob patterns) with the Hacker News posts')
+    parser.add_argument('--chunksize', type=int, default=100000,
+                        help='number of rows read at a time')
+    parser.add_argument('--local-utc', type=parseZone, default=3,
+                        help='UTC offset or time zone name used for the local time results')
+    parser.add_argument('--zones', type=parseZone, nargs='*', default=[],
+                        help='also print the best hour to post for each of these zones')
+    parser.add_argument('--cache', action='store_true',
+                        help='use (and build when needed) the columnar cache of hn_cache.py')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes, one file each (one per cpu by default)')
+    args = parser.parse_args()
+    zones = [args.local_utc] + args.zones #Zone names are binned post by post
+    stats = parallelHNStats(args.paths, args.workers, args.chunksize, args.cache, zones)
+    printReport(stats, args.local_utc)
+    if args.zones:
+        print('Best hour for Ask HN comments per zone:\n\n', stats.bestHours(args.zones))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Headless report of the Hacker News charts.
+
+Draws the five numbered graphs of "Analyzing Hacker News Posts.py" with the
+Agg backend, so it runs without Jupyter or a display. The charts are built from
+the precomputed aggregates of an HNStats (means and 95% confidence intervals
+from the counts, sums and sums of squares) instead of the raw rows, and each
+figure is rendered to PNG/SVG in its own worker process.
+
+Graphs 2 and 4 show each of the top 5 hours as its mean and confidence
+interval, since the individual posts of the strip plots are not kept. The
+hours are labelled in Eastern Time and in the local time zone (a UTC offset
+or a time zone name, Nairobi by default like the script).
+
+Usage:
+    python hn_report.py HN_posts_year_to_Sep_26_2016.csv --out report --formats png svg
+    python hn_report.py --store hn_store.npz --start 2016-09-01 --end 2016-09-26 --out report
+    python hn_report.py HN_posts_year_to_Sep_26_2016.csv --local-utc Asia/Kolkata
+'''
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg') #Headless backend, must be chosen before pyplot is imported
+import matplotlib.pyplot as plt
+import matplotlib.ticker as ticker
+import numpy as np
+
+from hn_engine import (CATEGORIES, HOUR_LABELS, METRICS, LABEL_HOURS, localHourLabels, parallelHNStats,
+                       parseZone, zoneName)
+
+Z_95 = 1.96 #Normal quantile of the 95% confidence interval
+LOCAL_ZONE = 'Africa/Nairobi' #Local time of the script (UTC+3)
+
+
+def zoneTitle(tz):
+    '''Returns the abbreviation and the name of the local time shown in the
+    graphs: ('NT', 'Nairobi Time') for 'Africa/Nairobi', ('LT', 'UTC+3') for 3.'''
+    if not isinstance(tz, str):
+        return 'LT', zoneName(tz)
+    city = tz.split('/')[-1].split('_')
+    return ''.join(word[0] for word in city).upper() + 'T', ' '.join(city) + ' Time'
+
+
+def meanAndError(counts, sums, sumsq):
+    '''counts, sums, sumsq = aggregates of one metric (same shapes).
+    Returns the means and the half width of their 95% confidence intervals.'''
+    counts = np.asarray(counts, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        variance = (sumsq - sums * means) / (counts - 1)
+        errors = Z_95 * np.sqrt(np.clip(variance, 0, None) / counts)
+    return means, np.nan_to_num(errors)
+
+
+def categoryPoints(stats, categories, metric):
+    '''Returns the means and errors of a metric for each category.'''
+    rows = [CATEGORIES.index(c) for c in categories]
+    m = METRICS.index(metric)
+    return meanAndError(stats.counts[rows].sum(axis=1),
+                        stats.sums[rows, :, m].sum(axis=1),
+                        stats.sumsq[rows, :, m].sum(axis=1))
+
+
+def topHourPoints(stats, category, metric, local_utc, n=5):
+    '''Returns the top n hours of a category (sorted by hour like the script),
+    their 'ET/local' labels, means and errors. Time zone names are resolved
+    in the middle of the time range of the posts.'''
+    top = stats.hourMeans(category, metric).head(n).index.sort_values()
+    hours = [LABEL_HOURS[h] for h in top]
+    row, m = CATEGORIES.index(category), METRICS.index(metric)
+    means, errors = meanAndError(stats.counts[row, hours], stats.sums[row, hours, m],
+                                 stats.sumsq[row, hours, m])
+    abbreviation = zoneTitle(local_utc)[0]
+    labels = ['{} ET\n{} {}'.format(e, l, abbreviation)
+              for e, l in zip(top, localHourLabels(top, local_utc, when=stats.middleTime()))]
+    return labels, means, errors
+
+
+def figureSpecs(stats, local_utc=LOCAL_ZONE):
+    '''Returns the list of figures to draw. Each spec is a small dict of plain
+    arrays, cheap to send to a worker process.'''
+    hour_axis = 'Hour (24hr format) ET=Eastern Time,  {}={}'.format(*zoneTitle(local_utc))
+    specs = []
+    means, errors = categoryPoints(stats, ['Ask HN', 'Show HN'], 'num_comments')
+    specs.append({'number': 1, 'kind': 'points', 'name': 'avg_comments',
+                  'title': 'Average Number of Comments\nfor Ask HN and Show HN',
+                  'x': ['Ask HN', 'Show HN'], 'series': [('num_comments', '#ff8c00', means, errors)],
+                  'ylim': (0, 16), 'xlabel': 'Post Category', 'ylabel': 'Avg Number of Comments'})
+
+    labels, means, errors = topHourPoints(stats, 'Ask HN', 'num_comments', local_utc)
+    specs.append({'number': 2, 'kind': 'hours', 'name': 'ask_top_hours',
+                  'title': 'Number of Ask HN Comments in top 5 Hours',
+                  'x': labels, 'means': means, 'errors': errors,
+                  'xlabel': hour_axis,
+                  'ylabel': 'Number of Comments'})
+
+    means, errors = categoryPoints(stats, ['Ask HN', 'Show HN'], 'num_points')
+    specs.append({'number': 3, 'kind': 'points', 'name': 'avg_points',
+                  'title': 'Average Number of Points\nfor Ask HN and Show HN',
+                  'x': ['Ask HN', 'Show HN'], 'series': [('num_points', '#229954', means, errors)],
+                  'ylim': (0, 20), 'ystep': 4, 'xlabel': 'Post Category',
+                  'ylabel': 'Avg Number of Points'})
+
+    labels, means, errors = topHourPoints(stats, 'Show HN', 'num_points', local_utc)
+    specs.append({'number': 4, 'kind': 'hours', 'name': 'show_top_hours',
+                  'title': 'Number of Show HN Points in top 5 Hours',
+                  'x': labels, 'means': means, 'errors': errors,
+                  'xlabel': hour_axis,
+                  'ylabel': 'Number of Points'})
+
+    series = []
+    for metric, color in zip(METRICS[::-1], ['#1f77b4', '#ff7f0e']):
+        means, errors = categoryPoints(stats, CATEGORIES, metric)
+        series.append((metric, color, means, errors))
+    specs.append({'number': 5, 'kind': 'points', 'name': 'avg_per_category',
+                  'title': 'Average Number of Comments\nand Points per Category',
+                  'x': CATEGORIES, 'series': series, 'ylim': (0, 18), 'legend': 'Variables',
+                  'xlabel': 'Post Category', 'ylabel': 'Average Number'})
+    return specs
+
+
+def drawPoints(ax, spec):
+    '''Point plot of means with confidence intervals, like sns.pointplot().'''
+    x = np.arange(len(spec['x']))
+    for label, color, means, errors in spec['series']:
+        ax.errorbar(x, means, yerr=errors, color=color, marker='o', markersize=8,
+                    linewidth=2, elinewidth=2.5, label=label)
+    ax.set_xticks(x)
+    ax.set_xticklabels(spec['x'])
+    ax.set_xlim(-0.5, len(x) - 0.5)
+    ax.set_ylim(*spec['ylim'])
+    if 'ystep' in spec:
+        ax.yaxis.set_major_locator(ticker.MultipleLocator(spec['ystep']))
+    if 'legend' in spec:
+        ax.legend(bbox_to_anchor=(1.05, 1), loc='best', title=spec['legend'])
+
+
+def drawHours(ax, spec):
+    '''One point with its confidence interval for each of the top hours.'''
+    x = np.arange(len(spec['x']))
+    colors = plt.get_cmap('Dark2_r')(np.linspace(0, 1, 8))
+    for i in x:
+        ax.errorbar(i, spec['means'][i], yerr=spec['errors'][i], color=colors[i % 8],
+                    marker='o', markersize=9, elinewidth=2.5, capsize=6)
+    ax.set_xticks(x)
+    ax.set_xticklabels(spec['x'])
+    ax.set_xlim(-0.5, len(x) - 0.5)
+
+
+def renderFigure(spec, out_dir, formats=('png',)):
+    '''Draws one spec and saves it in each format. Returns the saved paths.'''
+    figsize = (8.25, 5.5) if spec['kind'] == 'hours' else (6.5, 4)
+    fig, ax = plt.subplots(figsize=figsize)
+    if spec['kind'] == 'hours':
+        drawHours(ax, spec)
+    else:
+        drawPoints(ax, spec)
+    for side in ax.spines.values(): #Same as sns.despine(left=True,bottom=True)
+        side.set_visible(False)
+    ax.tick_params(axis='both', which='both', length=0)
+    ax.set_xlabel(spec['xlabel'], labelpad=15 if 'legend' in spec else 4)
+    ax.set_ylabel(spec['ylabel'])
+    ax.set_title('Graph {}. {}'.format(spec['number'], spec['title']))
+
+    paths = []
+    base = os.path.join(out_dir, 'graph{}_{}'.format(spec['number'], spec['name']))
+    for fmt in formats:
+        path = '{}.{}'.format(base, fmt)
+        fig.savefig(path, bbox_inches='tight')
+        paths.append(path)
+    plt.close(fig)
+    return paths
+
+
+def renderReport(stats, out_dir, formats=('png', 'svg'), workers=None, local_utc=LOCAL_ZONE):
+    '''Renders the five graphs of an HNStats in out_dir, one worker process per graph.
+    Returns the list of files written.'''
+    os.makedirs(out_dir, exist_ok=True)
+    specs = figureSpecs(stats, local_utc)
+    workers = min(workers or os.cpu_count() or 1, len(specs))
+    if workers == 1:
+        results = [renderFigure(spec, out_dir, formats) for spec in specs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(renderFigure, specs, [out_dir] * len(specs),
+                                    [tuple(formats)] * len(specs)))
+    return [path for paths in results for path in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless report of the Hacker News charts')
+    parser.add_argument('paths', nargs='*', help='csv files (or glob patterns) with the posts')
+    parser.add_argument('--store', help='read the aggregates from an hn_store.py file instead')
+    parser.add_argument('--start', help='first day taken from the store (YYYY-MM-DD)')
+    parser.add_argument('--end', help='last day taken from the store (YYYY-MM-DD)')
+    parser.add_argument('--out', default='report', help='output folder')
+    parser.add_argument('--formats', nargs='+', default=['png', 'svg'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', action='store_true', help='use the hn_cache.py columnar cache')
+    parser.add_argument('--local-utc', type=parseZone, default=LOCAL_ZONE,
+                        help='UTC offset or time zone name of the local time shown in graphs 2 and 4')
+    args = parser.parse_args()
+
+    if args.store:
+        from hn_store import AggregateStore
+        stats = AggregateStore.load(args.store).stats(args.start, args.end)
+    elif args.paths:
+        stats = parallelHNStats(args.paths, args.workers, cache=args.cache)
+    else:
+        parser.error('give csv files or --store')
+    for path in renderReport(stats, args.out, args.formats, args.workers, args.local_utc):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Incremental aggregate store for the Hacker News engagement stats.
+
+Keeps the running count, sum and sum of squares of 'num_points' and
+'num_comments' per (category, hour, day) in a small .npz file. New posts are
+added on top of the saved aggregates and posts already seen are skipped: the
+ids of the posts added are kept per day (a post always falls on the same
+day), so files, chunks and shards can come in any order (the dump is newest
+first). A chunk is only checked against the ids of the days it touches and
+only that range of days is updated, so a daily refresh costs the time of
+the new rows and not of the whole history. The averages and top-5 hours of
+the script are answered from the store.
+
+Usage:
+    python hn_store.py hn_store.npz new_posts.csv
+'''
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from hn_cache import SOURCE_COLS, typedChunk
+from hn_engine import CATEGORIES, METRICS, HNStats, epochHours
+
+DAY = 86400 #Seconds in a day
+
+
+class AggregateStore():
+    '''Running aggregates per (day, category, hour).
+    Days are counted from 1970-01-01 in Eastern Time and the arrays only cover
+    the days between the first and the last post added.'''
+
+    def __init__(self):
+        self.first_day = 0
+        self.counts = np.zeros((0, len(CATEGORIES), 24), dtype=np.int64)
+        self.sums = np.zeros((0, len(CATEGORIES), 24, len(METRICS)))
+        self.sumsq = np.zeros_like(self.sums)
+        self.day_ids = [] #Sorted ids of the posts added, one array per day
+
+    @property
+    def days(self):
+        '''Number of days covered by the store.'''
+        return len(self.counts)
+
+    def _cover(self, first_day, last_day):
+        '''Grows the arrays (at either end) to cover first_day to last_day.'''
+        if self.days == 0:
+            self.first_day = first_day
+        before = max(self.first_day - first_day, 0)
+        after = max(last_day - (self.first_day + self.days - 1), 0)
+        if before or after:
+            pad = ((before, after),) + ((0, 0),) * (self.counts.ndim - 1)
+            self.counts = np.pad(self.counts, pad)
+            pad = pad + ((0, 0),)
+            self.sums = np.pad(self.sums, pad)
+            self.sumsq = np.pad(self.sumsq, pad)
+            empty = np.zeros(0, dtype=np.int64)
+            self.day_ids = [empty] * before + self.day_ids + [empty] * after
+            self.first_day -= before
+
+    def _newRows(self, ids, day):
+        '''ids, day = id and day of each post of a chunk.
+        Returns the positions of the posts not added yet (the first of repeated
+        ids), and records their ids in the days they fall on.'''
+        _, order = np.unique(ids, return_index=True)
+        order = order[np.lexsort((ids[order], day[order]))]
+        ids, day = ids[order], day[order]
+        keep = np.ones(len(ids), dtype=bool)
+        days, starts = np.unique(day, return_index=True)
+        ends = np.append(starts[1:], len(ids))
+        for d, start, end in zip(days, starts, ends):
+            position = int(d) - self.first_day
+            known = self.day_ids[position]
+            if len(known):
+                keep[start:end] &= ~np.isin(ids[start:end], known)
+            self.day_ids[position] = np.union1d(known, ids[start:end][keep[start:end]])
+        return order[keep]
+
+    def add(self, frame):
+        '''frame = typed frame with 'id', 'Category', 'created_epoch' and the
+        METRICS columns (see hn_cache.typedChunk()).
+        Posts whose id was already added (or repeats in frame) are skipped.
+        Returns the number of posts added.'''
+        if len(frame) == 0:
+            return 0
+        epoch = frame['created_epoch'].values
+        day = epoch // DAY
+        self._cover(int(day.min()), int(day.max()))
+        rows = np.sort(self._newRows(frame['id'].values.astype(np.int64), day))
+        if len(rows) == 0:
+            return 0
+        epoch, day = epoch[rows], day[rows]
+
+        #Only the days of the new posts are binned and updated
+        first, last = int(day.min()) - self.first_day, int(day.max()) - self.first_day + 1
+        cells = len(CATEGORIES) * 24
+        key = ((day - self.first_day - first) * cells
+               + frame['Category'].cat.codes.values[rows].astype(np.int64) * 24 + epochHours(epoch))
+        size = (last - first) * cells
+        shape = (last - first,) + self.counts.shape[1:]
+        self.counts[first:last] += np.bincount(key, minlength=size).reshape(shape)
+        for i, metric in enumerate(METRICS):
+            values = frame[metric].values[rows].astype(np.float64)
+            self.sums[first:last, ..., i] += np.bincount(key, weights=values, minlength=size).reshape(shape)
+            self.sumsq[first:last, ..., i] += np.bincount(key, weights=values * values,
+                                                          minlength=size).reshape(shape)
+        return len(rows)
+
+    def addCSV(self, path, chunksize=100000):
+        '''Adds the new posts of a csv file, read in chunks. Returns the number of posts added.'''
+        added = 0
+        for chunk in pd.read_csv(path, usecols=SOURCE_COLS, chunksize=chunksize):
+            added += self.add(typedChunk(chunk))
+        return added
+
+    def _dayRange(self, start=None, end=None):
+        '''Returns the slice of days between the dates start and end (included).'''
+        def position(date, default):
+            if date is None:
+                return default
+            return int(pd.Timestamp(date).value // 10**9 // DAY) - self.first_day
+        first = min(max(position(start, 0), 0), self.days)
+        last = min(max(position(end, self.days - 1) + 1, first), self.days)
+        return slice(first, last)
+
+    def stats(self, start=None, end=None, zones=()):
+        '''Returns an HNStats with the aggregates of the days between start and end,
+        so every query of hn_engine (categoryMeans, hourMeans, bestHours) works.
+        zones = time zone names binned by local hour, each day and hour with its own offset.'''
+        days = self._dayRange(start, end)
+        stats = HNStats(zones)
+        counts = self.counts[days]
+        stats.counts += counts.sum(axis=0)
+        stats.sums += self.sums[days].sum(axis=0)
+        stats.sumsq += self.sumsq[days].sum(axis=0)
+        posted = np.flatnonzero(counts.sum(axis=(1, 2)))
+        if len(posted):
+            first = (self.first_day + days.start) * DAY
+            stats._addRange(first + int(posted[0]) * DAY, first + (int(posted[-1]) + 1) * DAY - 1)
+        if stats.zones:
+            #One row per day, category and hour: the cells are binned like posts
+            cells = np.indices(counts.shape).reshape(3, -1)
+            epoch = (self.first_day + days.start + cells[0]) * DAY + cells[2] * 3600
+            stats._addZoneBins(cells[1], epoch, counts.ravel().astype(np.float64),
+                               self.sums[days].reshape(-1, len(METRICS)))
+        return stats
+
+    def categoryStd(self, start=None, end=None):
+        '''Returns a dataframe with the standard deviation of each metric per category.'''
+        days = self._dayRange(start, end)
+        counts = self.counts[days].sum(axis=(0, 2)).astype(np.float64)
+        sums = self.sums[days].sum(axis=(0, 2))
+        sumsq = self.sumsq[days].sum(axis=(0, 2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = (sumsq - sums ** 2 / counts[:, None]) / (counts[:, None] - 1)
+        return pd.DataFrame(np.sqrt(np.clip(variance, 0, None)),
+                            index=pd.Index(CATEGORIES, name='Category'), columns=METRICS)
+
+    def topHours(self, category, sort_by, n=5, start=None, end=None, tz=None):
+        '''Returns the n hours with the highest average of sort_by for a category.'''
+        return self.stats(start, end, [tz]).hourMeans(category, sort_by, tz).head(n)
+
+    def save(self, path):
+        '''Saves the store in a .npz file.'''
+        np.savez(path, first_day=self.first_day,
+                 ids=np.concatenate(self.day_ids) if self.day_ids else np.zeros(0, dtype=np.int64),
+                 id_counts=np.array([len(ids) for ids in self.day_ids], dtype=np.int64),
+                 counts=self.counts, sums=self.sums, sumsq=self.sumsq)
+
+    @classmethod
+    def load(cls, path):
+        '''Returns the store saved in path, or an empty store if the file does not exist.'''
+        store = cls()
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                store.first_day = int(saved['first_day'])
+                id_counts = saved['id_counts']
+                if len(id_counts):
+                    store.day_ids = np.split(saved['ids'], np.cumsum(id_counts)[:-1])
+                store.counts = saved['counts']
+                store.sums = saved['sums']
+                store.sumsq = saved['sumsq']
+        return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental Hacker News aggregate store')
+    parser.add_argument('store', help='.npz file with the aggregates (created if missing)')
+    parser.add_argument('paths', nargs='*', help='csv files with new posts')
+    args = parser.parse_args()
+
+    store = AggregateStore.load(args.store)
+    for path in args.paths:
+        print(path, '{:,} new posts'.format(store.addCSV(path)))
+    store.save(args.store)
+
+    stats = store.stats()
+    print('Average comments and points:\n\n', stats.categoryMeans())
+    print('Top 5 hours for Ask HN comments (Eastern Time):\n\n',
+          store.topHours('Ask HN', 'num_comments')['num_comments'])
+    print('Top 5 hours for Show HN points (Eastern Time):\n\n',
+          store.topHours('Show HN', 'num_points')['num_points'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''AuthorIndex must leave out the posts without an author and accept an empty frame.
+
+    python -m pytest test_hn_authors.py
+'''
+
+import numpy as np
+import pandas as pd
+
+from hn_authors import AuthorIndex
+from hn_cache import typedChunk
+from test_hn_store import postsFrame
+
+
+def test_missing_authors_are_left_out():
+    df = postsFrame(np.arange(500), seed=6)
+    df.loc[::7, 'author'] = np.nan
+    known = df.dropna(subset=['author'])
+    typed = typedChunk(df) #Missing authors become '' in the typed frame
+    raw = df.assign(Category=typed['Category'], created_epoch=typed['created_epoch']) #NaN authors
+    for frame in (typed, raw):
+        index = AuthorIndex(frame)
+        assert index.category_counts.sum() == len(known)
+        for hour in range(24):
+            top = index.topK(5, 'num_points', hour=hour)
+            assert top['author'].notna().all() and (top['author'] != '').all()
+    expected = known.groupby('author')['num_comments'].mean().sort_values(ascending=False, kind='mergesort')
+    np.testing.assert_allclose(index.topK(3)['avg_num_comments'].values, expected.head(3).values)
+
+
+def test_empty_frame():
+    index = AuthorIndex(typedChunk(postsFrame(np.arange(0))))
+    assert index.size == 0
+    assert len(index.topK(10, category='Ask HN', hour=15)) == 0
+    assert len(index.topK(10)) == 0
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''AggregateStore must count every post once, whatever the order of the ids,
+and bin the posts by the local hour of their own time zone offset.
+
+    python -m pytest test_hn_store.py
+'''
+
+import numpy as np
+import pandas as pd
+
+from hn_engine import hnStats
+from hn_cache import typedChunk
+from hn_store import AggregateStore
+
+
+def postsFrame(ids, seed=0):
+    '''Returns a csv-like dataframe of posts with the given ids.'''
+    rng = np.random.default_rng(seed)
+    n = len(ids)
+    titles = np.array(['Ask HN: why?', 'Show HN: a tool', 'A story'])[rng.integers(0, 3, n)]
+    dates = pd.Timestamp('2016-01-01') + pd.to_timedelta(rng.integers(0, 300 * 24 * 60, n), unit='min')
+    return pd.DataFrame({'id': ids, 'title': titles,
+                         'num_points': rng.integers(0, 500, n), 'num_comments': rng.integers(0, 200, n),
+                         'author': ['user{}'.format(i % 37) for i in range(n)],
+                         'created_at': dates.strftime('%m/%d/%Y %H:%M')})
+
+
+def checkCounts(store, df):
+    expected = hnStats(typedChunk(df))
+    stats = store.stats()
+    assert store.counts.sum() == len(df)
+    np.testing.assert_array_equal(stats.counts, expected.counts)
+    np.testing.assert_allclose(stats.sums, expected.sums)
+
+
+def test_descending_ids(tmp_path):
+    df = postsFrame(np.arange(1000, 0, -1))
+    path = tmp_path / 'posts.csv'
+    df.to_csv(path, index=False)
+    store = AggregateStore()
+    assert store.addCSV(path, chunksize=100) == 1000
+    checkCounts(store, df)
+    assert store.addCSV(path, chunksize=100) == 0 #Second pass adds nothing
+
+
+def test_unsorted_ids_and_shards(tmp_path):
+    ids = np.random.default_rng(1).permutation(np.arange(5000, 7000))
+    df = postsFrame(ids, seed=2)
+    shards = [df.iloc[1500:], df.iloc[:800], df.iloc[800:1500]] #Loaded out of order
+    store = AggregateStore()
+    for i, shard in enumerate(shards):
+        path = tmp_path / 'shard{}.csv'.format(i)
+        shard.to_csv(path, index=False)
+        store.addCSV(path, chunksize=300)
+        store.save(tmp_path / 'store.npz')
+        store = AggregateStore.load(tmp_path / 'store.npz')
+    checkCounts(store, df)
+
+    #Overlapping shard and repeated ids in the same chunk are counted once
+    overlap = pd.concat([df.iloc[100:200], df.iloc[100:150], postsFrame(np.array([9000, 9000]), seed=3)])
+    assert store.add(typedChunk(overlap)) == 1
+    assert store.counts.sum() == len(df) + 1
+
+
+def test_zone_hours_follow_daylight_saving():
+    df = typedChunk(postsFrame(np.arange(3000), seed=4))
+    zones = ['Europe/London', 'Asia/Kolkata']
+    stats = hnStats(df, zones)
+    #Local hour of the start of each Eastern hour, with the offsets of both zones at that moment
+    wall = pd.DatetimeIndex(pd.to_datetime(df['created_epoch'], unit='s')).floor('h')
+    source = wall.tz_localize('America/New_York', ambiguous=False, nonexistent='shift_backward')
+    for tz in zones:
+        hours = source.tz_convert(tz).hour.values
+        expected = df.groupby(hours)['num_points'].size()
+        counts = stats.zones[tz][0].sum(axis=0)
+        np.testing.assert_array_equal(counts[expected.index], expected.values)
+
+    store = AggregateStore()
+    store.add(df)
+    for tz in zones:
+        pd.testing.assert_frame_equal(store.stats(zones=zones).hourMeans('Ask HN', 'num_points', tz),
+                                      stats.hourMeans('Ask HN', 'num_points', tz))
+
+
+def test_daily_refresh_only_touches_new_days(tmp_path):
+    df = typedChunk(postsFrame(np.arange(2000), seed=5))
+    day = df['created_epoch'].values // 86400
+    last = day == day.max()
+    store = AggregateStore()
+    store.add(df[~last])
+    store.save(tmp_path / 'store.npz')
+    store = AggregateStore.load(tmp_path / 'store.npz')
+    before = store.counts.copy()
+    assert store.add(df[last]) == last.sum()
+    assert store.add(df) == 0 #Every id is known, whatever the day
+    np.testing.assert_array_equal(store.counts[:len(before) - 1], before[:-1])
+    checkCounts(store, postsFrame(np.arange(2000), seed=5))
+
+    AggregateStore().save(tmp_path / 'empty.npz')
+    assert AggregateStore.load(tmp_path / 'empty.npz').day_ids == []
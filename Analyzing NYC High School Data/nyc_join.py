@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Keyed join of the NYC high school datasets on an integer DBN.
+
+The notebook builds the DBN of class_size with apply(pad_csd) and string
+concatenation, then merges sat_results with ap_2010 and graduation (left) and
+with class_size, demographics, survey and hs_directory (inner) one after
+another, each merge copying the whole combined table. SchoolJoin:
+
+- encodes the DBN of every source once as an integer key
+  district * 10000 + borough * 1000 + number ('01M292' -> 10292, boroughs in
+  BOROUGHS order); class_size gets its keys straight from CSD and SCHOOL CODE;
+- keeps every source indexed by that key, with class_size already grouped by
+  school and demographics and graduation filtered per school year and cohort
+  when a combined table is asked for;
+- builds the combined table in one pass: the rows of sat_results whose key is
+  in every inner source are kept, and the columns of each source are looked up
+  with a reindex on the keys and concatenated once.
+
+Columns found in more than one source get the _x/_y suffixes that the chain of
+merges gives them. A source with repeated keys (e.g. ap_2010) is joined with
+merge instead, which repeats the rows like the notebook does. DBNs that don't
+follow the 'DDBNNN' pattern get the key -1 and are never matched.
+
+Usage:
+    from nyc_join import SchoolJoin
+    schools = SchoolJoin(data)              #the data dict of the notebook
+    combined = schools.combined()           #same table as the notebook
+    schools.combined(schoolyear=20102011, borough='K')
+
+    python nyc_join.py schools
+'''
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+BOROUGHS = 'MXKQR' #Manhattan, Bronx, Brooklyn, Queens, Staten Island
+DBN_PATTERN = r'\d{2}[MXKQR]\d{3}'
+SCHOOL_CODE_PATTERN = r'[MXKQR]\d{3}'
+#Sources joined to sat_results, in the order of the notebook
+JOINS = [('ap_2010', 'left'), ('graduation', 'left'), ('class_size', 'inner'),
+         ('demographics', 'inner'), ('survey', 'inner'), ('hs_directory', 'inner')]
+
+
+def _boroughIndex(letters):
+    return letters.map({b: i for i, b in enumerate(BOROUGHS)})
+
+
+def dbnKeys(dbn):
+    '''dbn = Series of DBN strings. Returns the int64 keys, -1 for the DBNs
+    that don't follow the pattern.'''
+    dbn = pd.Series(dbn).astype(str).str.strip()
+    valid = dbn.str.fullmatch(DBN_PATTERN).fillna(False).values.astype(bool)
+    keys = np.full(len(dbn), -1, dtype=np.int64)
+    dbn = dbn[valid]
+    keys[valid] = (dbn.str[:2].astype(np.int64) * 10000 + _boroughIndex(dbn.str[2]).astype(np.int64) * 1000
+                   + dbn.str[3:].astype(np.int64)).values
+    return keys
+
+
+def classSizeKeys(csd, school_code):
+    '''csd = district numbers, school_code = codes like 'M015' of class_size.
+    Returns the int64 keys, the same as dbnKeys() of the padded DBN.'''
+    csd = pd.to_numeric(pd.Series(csd), errors='coerce')
+    code = pd.Series(school_code).astype(str).str.strip()
+    valid = (code.str.fullmatch(SCHOOL_CODE_PATTERN).fillna(False) & csd.between(0, 99)).values.astype(bool)
+    keys = np.full(len(code), -1, dtype=np.int64)
+    code = code[valid]
+    keys[valid] = (csd[valid].astype(np.int64) * 10000 + _boroughIndex(code.str[0]).astype(np.int64) * 1000
+                   + code.str[1:].astype(np.int64)).values
+    return keys
+
+
+def decodeKeys(keys):
+    '''Returns the DBN strings of integer keys.'''
+    keys = np.asarray(keys, dtype=np.int64)
+    return ['{0:02d}{1}{2:03d}'.format(k // 10000, BOROUGHS[k // 1000 % 10], k % 1000) for k in keys]
+
+
+def _indexed(df, keys):
+    '''Returns df indexed by the keys, without the rows that have no key.'''
+    df = df[keys >= 0]
+    df.index = pd.Index(keys[keys >= 0], name='key')
+    return df
+
+
+class SchoolJoin():
+    '''The NYC school datasets indexed by integer DBN keys.'''
+
+    def __init__(self, data, grade='09-12', program='GEN ED'):
+        '''data = dict of dataframes of the notebook ('sat_results', 'ap_2010',
+        'class_size', 'demographics', 'graduation', 'hs_directory', 'survey'),
+        grade and program = class_size rows used for the class sizes.'''
+        def withoutDBN(df):
+            return df.drop(columns=['DBN'], errors='ignore')
+
+        self.sat_results = data['sat_results']
+        self.sat_keys = dbnKeys(self.sat_results['DBN'])
+        self.sources = {name: _indexed(withoutDBN(data[name]), dbnKeys(data[name]['DBN']))
+                        for name in ('ap_2010', 'graduation', 'demographics', 'survey')}
+        directory = data['hs_directory']
+        self.sources['hs_directory'] = _indexed(withoutDBN(directory), dbnKeys(directory['dbn']))
+
+        #Average class sizes of each school, grouped once on the integer keys
+        class_size = data['class_size']
+        class_size = class_size[(class_size['GRADE '] == grade) & (class_size['PROGRAM TYPE'] == program)]
+        keys = classSizeKeys(class_size['CSD'], class_size['SCHOOL CODE'])
+        numeric = class_size.select_dtypes('number')
+        self.sources['class_size'] = numeric[keys >= 0].groupby(keys[keys >= 0]).mean().rename_axis('key')
+
+    def source(self, name, schoolyear=20112012, cohort='2006'):
+        '''Returns the indexed frame of a source, demographics filtered by
+        schoolyear and graduation by cohort (the 'Total Cohort' rows).'''
+        df = self.sources[name]
+        if name == 'demographics' and schoolyear is not None:
+            df = df[df['schoolyear'] == schoolyear]
+        elif name == 'graduation' and cohort is not None:
+            df = df[(df['Cohort'].astype(str) == str(cohort)) & (df['Demographic'] == 'Total Cohort')]
+        return df
+
+    def combined(self, schoolyear=20112012, cohort='2006', borough=None, fill=True):
+        '''schoolyear = demographics school year, cohort = graduation cohort,
+        borough = letter (or list of letters) of BOROUGHS to keep (all by
+        default), fill = fill the missing values with the column means and 0,
+        like the notebook. Returns the combined dataframe with a school_dist
+        column.'''
+        sources = [(self.source(name, schoolyear, cohort), how) for name, how in JOINS]
+        keys = self.sat_keys
+        rows = np.ones(len(keys), dtype=bool)
+        if borough is not None:
+            wanted = [BOROUGHS.index(b) for b in ([borough] if isinstance(borough, str) else borough)]
+            rows &= np.isin(keys // 1000 % 10, wanted) & (keys >= 0)
+        for df, how in sources:
+            if how == 'inner':
+                rows &= np.isin(keys, df.index.values)
+        base = self.sat_results[rows].reset_index(drop=True)
+        keys = keys[rows]
+
+        names = list(base.columns)
+        parts = [base]
+        for df, how in sources:
+            #Same names as the chain of merges: _x for the table so far, _y for the source
+            overlap = set(names) & set(df.columns)
+            names = [n + '_x' if n in overlap else n for n in names]
+            source_names = [n + '_y' if n in overlap else n for n in df.columns]
+            if df.index.is_unique:
+                block = df.reindex(keys)
+                block.index = base.index
+                block.columns = source_names
+                parts.append(block)
+                names += source_names
+            else:
+                #Repeated keys: merge repeats the rows of the table so far
+                current = pd.concat(parts, axis=1)
+                current.columns = names
+                current['__key'] = keys
+                right = df.set_axis(source_names, axis=1).rename_axis('__key').reset_index()
+                current = current.merge(right, on='__key', how=how)
+                keys = current.pop('__key').values
+                names = list(current.columns)
+                base = current
+                parts = [current]
+
+        combined = pd.concat(parts, axis=1) if len(parts) > 1 else parts[0]
+        combined.columns = names
+        if fill:
+            combined = combined.fillna(combined.mean(numeric_only=True))
+            combined = combined.fillna(0)
+        combined['school_dist'] = pd.Series(keys // 10000, index=combined.index).map('{0:02d}'.format)
+        return combined
+
+
+def loadData(folder='schools'):
+    '''Reads the csv files and the surveys like the notebook, with the SAT and
+    AP columns made numeric and the coordinates of hs_directory. Returns the data dict.'''
+    data = {}
+    for name in ['ap_2010', 'class_size', 'demographics', 'graduation', 'hs_directory', 'sat_results']:
+        data[name] = pd.read_csv(os.path.join(folder, name + '.csv'))
+
+    surveys = [pd.read_csv(os.path.join(folder, f), delimiter='\t', encoding='windows-1252')
+               for f in ['survey_all.txt', 'survey_d75.txt']]
+    survey = pd.concat(surveys, axis=0)
+    survey['DBN'] = survey['dbn']
+    fields = ['rr_s', 'rr_t', 'rr_p', 'N_s', 'N_t', 'N_p'] + ['{0}_{1}_11'.format(f, who)
+              for who in ['p', 't', 's', 'tot'] for f in ['saf', 'com', 'eng', 'aca']]
+    data['survey'] = survey.loc[:, ['DBN'] + fields]
+
+    sat = data['sat_results']
+    cols = ['SAT Math Avg. Score', 'SAT Critical Reading Avg. Score', 'SAT Writing Avg. Score']
+    for c in cols:
+        sat[c] = pd.to_numeric(sat[c], errors='coerce')
+    sat['sat_score'] = sat[cols[0]] + sat[cols[1]] + sat[cols[2]]
+
+    coords = data['hs_directory']['Location 1'].astype(str).str.extract(r'\((.+), (.+)\)')
+    data['hs_directory']['lat'] = pd.to_numeric(coords[0], errors='coerce')
+    data['hs_directory']['lon'] = pd.to_numeric(coords[1].str.strip(), errors='coerce')
+
+    for col in ['AP Test Takers ', 'Total Exams Taken', 'Number of Exams with scores 3 4 or 5']:
+        data['ap_2010'][col] = pd.to_numeric(data['ap_2010'][col], errors='coerce')
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Combine the NYC school datasets on integer DBN keys')
+    parser.add_argument('folder', help='folder with the csv files and the surveys')
+    parser.add_argument('--schoolyear', type=int, default=20112012)
+    parser.add_argument('--cohort', default='2006')
+    parser.add_argument('--borough', default=None, help='one of ' + BOROUGHS)
+    args = parser.parse_args()
+
+    data = loadData(args.folder)
+    start = time.perf_counter()
+    schools = SchoolJoin(data)
+    index_time = time.perf_counter() - start
+    start = time.perf_counter()
+    combined = schools.combined(args.schoolyear, args.cohort, args.borough)
+    print('Indexed the sources in {:.3f} s, combined in {:.3f} s'.format(index_time, time.perf_counter() - start))
+    print('Schools: {:,}, columns: {:,}'.format(len(combined), combined.shape[1]))
+    print(combined.groupby('school_dist')['sat_score'].mean().round(1))
+
+
+if __name__ == '__main__':
+    main()
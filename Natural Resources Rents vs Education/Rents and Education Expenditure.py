@@ -19,9 +19,12 @@ import seaborn as sns
 # In[2]:
 
 
-#Open the dataset and set display values
+#Set display values. The full dataset is not loaded: a catalog of its indicators is read
+#first and only the rows of the chosen indicators are loaded afterwards (see wdi_loader.py)
+from wdi_loader import COLUMNS, indicatorCatalog, loadIndicators
+from wdi_cube import IndicatorCube
 
-indicators_df = pd.read_csv('Data/Indicators.csv')
+indicators_catalog = indicatorCatalog('Data/Indicators.csv')
 pd.set_option('display.max_rows', 6000000)#Display as much rows as possible
 
 
@@ -29,7 +32,7 @@ pd.set_option('display.max_rows', 6000000)#Display as much rows as possible
 
 
 #Explore the names of the columns
-indicators_df.columns
+COLUMNS
 
 
 # In[4]:
@@ -37,20 +40,20 @@ indicators_df.columns
 
 #Explore the subjects of study in the column "IndicatorName". It will show ALL the rows, 
 #so uncomment only when needed.
-# pd.value_counts(indicators_df['IndicatorName'])
+# indicators_catalog.set_index('IndicatorName')['Rows']
 
 
 # In[5]:
 
 
 #Show how many indicators have information about rents as % of GDP:
-rents_filter = indicators_df['IndicatorName'].str.contains('rents',case=False)
-rents = indicators_df[rents_filter]
+rents_filter = indicators_catalog['IndicatorName'].str.contains('rents',case=False)
+rents = indicators_catalog[rents_filter]
 print('*Rents indicators:',rents['IndicatorName'].unique())
 
 #Show how many indicators have information about education expenditure:
-edu_filter = indicators_df['IndicatorName'].str.contains(r'^(?=.*education)(?=.*expenditure)')#Used regex                                                         case=False)
-edu = indicators_df[edu_filter]
+edu_filter = indicators_catalog['IndicatorName'].str.contains(r'^(?=.*education)(?=.*expenditure)')#Used regex                                                         case=False)
+edu = indicators_catalog[edu_filter]
 print('*Education indicators',edu['IndicatorName'].unique())
 
 
@@ -58,11 +61,15 @@ print('*Education indicators',edu['IndicatorName'].unique())
 
 
 #Choosing 'Total natural resources rents (% of GDP)' indicator
-NRrents_filter = indicators_df['IndicatorName'] == 'Total natural resources rents (% of GDP)'
-#Choosing 'Government expenditure on education as % of GDP (%)' indicator
-eduex_filter = indicators_df['IndicatorName'] == 'Government expenditure on education as % of GDP (%)'
-
-focused_df = indicators_df[NRrents_filter|eduex_filter]
+#and 'Government expenditure on education as % of GDP (%)' indicator.
+#Only their rows are read from the csv file. Plain strings (categorical=False) keep
+#the seaborn legends and facets limited to the countries being plotted
+RENTS = 'Total natural resources rents (% of GDP)'
+EDUCATION = 'Government expenditure on education as % of GDP (%)'
+focused_df = loadIndicators('Data/Indicators.csv',[RENTS,EDUCATION],categorical=False)
+#The (indicator, country, year) cube of the two indicators (see wdi_cube.py): the slices
+#used below for the rankings, the correlations and the plots are array lookups
+cube = IndicatorCube.fromFrame(focused_df)
 #Checking for null values in the 'eduex_df' dataframe:
 print('Are there any null values in the ifilter_df dataframe?:',focused_df['Value'].isna().values.any())
 print('Total null values in the ifilter_df dataframe:',focused_df['Value'].isna().sum())
@@ -75,8 +82,7 @@ print('Total null values in the ifilter_df dataframe:',focused_df['Value'].isna(
 
 
 #Distribution of data for the year 2013, since there's no rents data for the year 2014:
-year_mask = focused_df['Year']==2013
-data_2013 = focused_df[year_mask]
+data_2013 = cube.frame([RENTS,EDUCATION],years=[2013])
 
 #Plot a kernel density plot (similar to histogram)
 sns.set(font_scale=0.9)
@@ -116,8 +122,7 @@ print('The Rents Indicator has (a) country(ies) with max',
 #by looking at the number of times a country appears in the dataset holding the education indicator
 #we can see how many years of data it has. The following code shows a list of 20 countries with the
 #most years of data.
-most_years = focused_df[focused_df['IndicatorName']=='Government expenditure on education as % of GDP (%)'
-                              ]['CountryName'].value_counts()
+most_years = cube.yearsOfData(EDUCATION)
 
 titles = pd.Series(['Years of Data'],index=['Country'])#Set titles to show in output
 titles.append(most_years.head(20))
@@ -130,9 +135,10 @@ titles.append(most_years.head(20))
 #The threshold would be 30 years of data, so now countries that have less than 30 years
 #will be eliminated and countries with more than 30 years will have years removed so the average can be
 #done over 30 years for all countries. The purpose is to get a mean = sum(values)/30years for each country.
-edu_df = focused_df[focused_df['CountryName'].isin(most_years.index)]
-#Filter Education Indicator
-edu_df = focused_df[focused_df['IndicatorName']=='Government expenditure on education as % of GDP (%)']
+#Education Indicator of the countries with data
+edu_df = cube.frame(EDUCATION,countries=most_years.index)
+
+from wdi_rank import equalYearsMeans
 
 def getEqualYearsMean(df,index_col,value_cols,threshold):
     '''df = dataframe, index_col = df column to set as index,
@@ -140,20 +146,11 @@ def getEqualYearsMean(df,index_col,value_cols,threshold):
     threshold = items must have this amount of years (int).
     This function removes the years with the least values from countries that exceed the number in 
     the threshold. It then gets a mean by dividing the sum of values by the same amount of years for 
-    each country. Returns a dataframe of countries ranked by value of mean.'''
-    threshold = threshold #Anything that occurs less than or more than this will be removed.
-    newIndex = df.set_index(index_col)#set new index to make selection by index posible
-    values = newIndex.index.value_counts() #Count ocurrences of index values
-    to_keep = values[values>=threshold].index.values #Keep index values that ocurr > threshold
-    rank_df = newIndex.loc[to_keep,value_cols]#Select rows and columns to keep
-    #Sort values in descending order to meet threshold
-    rank_df = rank_df.sort_values(value_cols[1],ascending=False)
-    rank_df = rank_df.groupby(rank_df.index).head(threshold)#group again 
-    #Since values are sorted, head() will show highest values
-    rank_df = rank_df.groupby([rank_df.index,value_cols[0]]).mean()                   .sort_values(value_cols[1],ascending=False)#Sort values of final dataframe
-    rank_df = rank_df.reset_index(level=1)#Reset index to convert the 2nd index into a column
-    
-    return rank_df
+    each country. Returns a dataframe of countries ranked by value of mean.
+    The rows are sorted once by country and value, and the mean of the highest values
+    is taken from cumulative sums (see wdi_rank.py, which also ranks many thresholds
+    with a single sort using equalYearsMeans()).'''
+    return equalYearsMeans(df,index_col,value_cols,[threshold])[threshold]
 
 # #Ranking countries with the highest average Government expenditure on education as % of GDP indicator:
 # #Show top 10 countries with the highest average. 
@@ -165,8 +162,13 @@ high_edurank_df.head(10)
 
 
 #Function to produce a map given a list of countries and values.
-import requests #Import to use the locateAndCreateBubbleMap() properly.
-import folium
+from country_geocoder import CountryGeocoder
+from bubble_map import bubbleCollection, bubbleMap, writeGeoJSON
+import sys
+sys.path.append('..')#The geocoding package is at the root of the repository
+from geocoding import countryFetch
+#Offline centroids first, the rest is asked to Nominatim concurrently (1 request per second) and cached
+geocoder = CountryGeocoder('Data/geocode_cache.json',fetch=countryFetch)
 
 def locateAndCreateBubbleMap(df,df_value,countries,colors,title):
     '''Find locations of countries and plot a Bubble Map with circle markers.
@@ -175,36 +177,17 @@ def locateAndCreateBubbleMap(df,df_value,countries,colors,title):
     Returns a bubble map with circle markers representing each country, the
     size of the circle being the scaled value to represent.'''
     
-    locations = []#Locations in [lat,lon] format
-    for c in high_edurank_df.head(10).index:#Iterate over list of country names
-        #Use this url to get country locations by inserting the country name
-        url = '{0}{1}{2}'.format('http://nominatim.openstreetmap.org/search?country=',
-                                 c,
-                                 '&format=json&polygon=0')
-        response = requests.get(url).json()[0]
-        lst = [response.get(key) for key in ['lat','lon']]
-        output = [float(i) for i in lst]
-        locations.append(output)
+    df = df.loc[list(countries)]
+    codes = df['CountryCode'] if 'CountryCode' in df.columns else None
+    locations = geocoder.locateMany(df.index,codes)#Locations in [lat,lon] format, all at once
         
     print('\033[1m' + title + '\033[0m')#Title of map
     
-    m = folium.Map(width=600,height=360,
-                  location=[31,20],
-                  tiles='openstreetmap',zoom_start=1.4
-                  )
-
-    for i in range(len(df)):
-        folium.CircleMarker(location=(locations[i][0], locations[i][1]),
-                            radius= df[df_value].values[i]*1.1,
-                            color=colors[i],
-                            opacity=0.65,
-                            fill=colors[i],
-                            fill_opacity=0.6,
-                            tooltip='<b><font color=%(color)s><tooltiptext=background-color:#616161e6>%(country)s \
-                            <br/>Mean: %(mean)s</font> \
-                            </b>'%{'color':colors[i],'country':df.index[i],
-                              'mean':'{:.3f}'.format(df[df_value].values[i])}
-                           ).add_to(m)
+    #All the markers as one GeoJSON layer, saved as the map1.geojson file too
+    collection = bubbleCollection(locations[:,0],locations[:,1],df[df_value].values,colors,
+                                  labels=df.index,value_name='Mean')
+    writeGeoJSON(collection,'map1.geojson')
+    m = bubbleMap(collection,value_name='Mean')
 
     return display(m)
 
@@ -234,8 +217,8 @@ plt.show()
 # In[13]:
 
 
-#Filter rents and education dataframe to show only 5 top countries:
-top_5_df = focused_df[focused_df['CountryName'].isin(high_edurank_df.head().index)]
+#Filter rents and education dataframe to show only 5 top countries (in alphabetical order, like the csv):
+top_5_df = cube.frame([RENTS,EDUCATION],countries=sorted(high_edurank_df.head().index))
 
 
 # In[14]:
@@ -255,31 +238,14 @@ print('Graph 3. 3 out of the 5 countries show a greater percentage in expenditur
 
 #Correlation between the variables:
 
-def correlation(df,CountryName,variable1,variable2):
-    '''Returns the correlation after filtering the main dataframe df to avoid errors.
-    df = dataframe, CountryName = type str, country name as it appears in df, 
-    variable1 = type str, first indicator name as it appears on df
-    variable2 = type str, second indicator name as it appears on df
-    Returns the variable correlation for a country'''
-    country_filt = df['CountryName']==CountryName
-    country_df = df[country_filt]
-    #Filtering to make sure both variables appear for the same year
-    #in order to make a correlation counting variable1, variable2 for year1, var1, var2 for year2, etc. 
-    year_filt = country_df['Year'].value_counts() == 2 #2 is for the two variables
-    country_df = country_df[country_df['Year'].isin(year_filt[year_filt==True].index)]
-
-    country_corr = np.corrcoef(country_df[country_df['IndicatorName']==
-                           'Government expenditure on education as % of GDP (%)']['Value'],
-                           country_df[country_df['IndicatorName']==
-                                      'Total natural resources rents (% of GDP)']['Value'])
-    
-    return country_df,round(country_corr[0][1],5)
+#The correlations of all countries are computed at once (see wdi_corr.py): for each country,
+#the correlation of the two indicators over the years it has both, and the number of those years
+from wdi_corr import correlateAll
+corr_table = correlateAll(cube,EDUCATION,RENTS)
 
 #Loop through the top five countries and print their correlation
 for country in high_edurank_df.head().index:
-    print(country,'correlation between indicators is:',correlation(focused_df,country,
-                              'Government expenditure on education as % of GDP (%)',
-                              'Total natural resources rents (% of GDP)')[1])
+    print(country,'correlation between indicators is:',round(corr_table['pearson'].get(country,np.nan),5))
 
 
 # In[16]:
@@ -311,8 +277,7 @@ plt.show()
 
 #Taking the rents indicator and performing the same operations done on the education indicator:
 #How many years of data does each country have for this indicator?
-most_years = focused_df[focused_df['IndicatorName']=='Total natural resources rents (% of GDP)'
-                              ]['CountryName'].value_counts()
+most_years = cube.yearsOfData(RENTS)
 most_years.head(20)
 
 
@@ -324,9 +289,8 @@ most_years.head(20)
 #of rents as % of GDP, keeping in mind that most of this countries have little data
 #for the education expenditure indicator:
 
-rents_df = focused_df[focused_df['CountryName'].isin(most_years.index)]
-#Filter Rents Indicator
-rents_df = focused_df[focused_df['IndicatorName']=='Total natural resources rents (% of GDP)']
+#Rents Indicator of the countries with data
+rents_df = cube.frame(RENTS,countries=most_years.index)
 
 # Use the getEqualYearsMean() function created in this project to get the highest averages:
 high_rentsrank_df = getEqualYearsMean(rents_df,'CountryName',['CountryCode','Value'],44)
@@ -337,7 +301,7 @@ high_rentsrank_df.head(10)
 
 
 #Filter rents and education dataframe to show only 5 top countries with highest rents average:
-top_5_rentsdf = focused_df[focused_df['CountryName'].isin(high_rentsrank_df.head().index)]
+top_5_rentsdf = cube.frame([RENTS,EDUCATION],countries=sorted(high_rentsrank_df.head().index))
 
 #Plot two charts to compare the Education indicator with the Rents indicator over time:
 g4 = sns.FacetGrid(top_5_rentsdf,col='IndicatorName',height=6,hue='CountryName',palette='bright')
@@ -375,9 +339,8 @@ edu14_yr_df.head()
 
 
 #The dataframe above gives us a list of countries to choose for the highest rents average:
-new_rents_df = focused_df[focused_df['CountryName'].isin(edu14_yr_df.index)]
-#Filter Rents Indicator
-new_rents_df = new_rents_df[new_rents_df['IndicatorName']=='Total natural resources rents (% of GDP)']
+#Rents Indicator of those countries
+new_rents_df = cube.frame(RENTS,countries=edu14_yr_df.index)
 
 #Use the getEqualYearsMean() function created in this project to get the highest averages:
 high_rentsrank_df = getEqualYearsMean(new_rents_df,'CountryName',['CountryCode','Value'],44)
@@ -389,7 +352,7 @@ high_rentsrank_df.head()
 
 #Filter rents and education dataframe to get a new top 5 of 
 #countries with highest rents average:
-top_5_rentsdf = focused_df[focused_df['CountryName'].isin(high_rentsrank_df.head().index)]
+top_5_rentsdf = cube.frame([RENTS,EDUCATION],countries=sorted(high_rentsrank_df.head().index))
 
 #Plot again two charts to compare the Education indicator with the Rents indicator over time:
 g5 = sns.FacetGrid(top_5_rentsdf,col='IndicatorName',height=6,hue='CountryName',palette='bright')
@@ -403,11 +366,9 @@ print("Graph 6. Now we have countries that at least have 15 years worth of data
 # In[24]:
 
 
-#Now a proper correlation between variables can be done:
+#Now a proper correlation between variables can be done (corr_table has every country):
 for country in high_rentsrank_df.head().index:
-    print(country,'correlation between indicators is:',correlation(focused_df,country,
-                              'Government expenditure on education as % of GDP (%)',
-                              'Total natural resources rents (% of GDP)')[1])
+    print(country,'correlation between indicators is:',round(corr_table['pearson'].get(country,np.nan),5))
 
 
 # In[25]:
@@ -439,15 +400,13 @@ print("Graph 7. Except for Burundi, which resembles something like a positive co
 #high education expenditure and the top 5 countries with high rents
 
 #First join the dataframes containing both top 5s:
-hi_edu_rents_df = top_5_df[top_5_df
-                           ['IndicatorName']=='Total natural resources rents (% of GDP)'] \
+hi_edu_rents_df = cube.frame(RENTS,countries=sorted(high_edurank_df.head().index)) \
                            .assign(Category='Rents of top 5 Countries with High Education Expenditure Average')
 
-hi_rents_df = top_5_rentsdf[top_5_rentsdf
-                            ['IndicatorName']=='Total natural resources rents (% of GDP)'] \
+hi_rents_df = cube.frame(RENTS,countries=sorted(high_rentsrank_df.head().index)) \
                             .assign(Category='Rents of top 5 Countries with High Natural Resources Rents Average')
 
-all_top_countries = pd.concat([hi_edu_rents_df,hi_rents_df])
+all_top_countries = pd.concat([hi_edu_rents_df,hi_rents_df],ignore_index=True)
 all_top_countries.head()
 
 
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Bubble maps written as one compact GeoJSON FeatureCollection.
+
+locateAndCreateBubbleMap() in the script added one folium CircleMarker per
+country, each with its own hand-formatted HTML tooltip, and 'map1.geojson'
+was made separately with a triangle polygon per country. Here the markers are
+built from arrays (lat, lon, value, color) into a single FeatureCollection of
+points: every style value is a property of its feature, one style function
+turns the properties into the circle style, and one GeoJsonTooltip shows the
+label and the value. The same collection is written as the .geojson file and
+drawn by folium as a single layer.
+
+For thousands of points, clusterPoints() merges the points that fall in the
+same cell of a lat/lon grid into one bubble (mean position, mean value and
+number of points).
+
+Usage:
+    from bubble_map import bubbleCollection, bubbleMap, writeGeoJSON
+    collection = bubbleCollection(locations[:, 0], locations[:, 1], df['Value'], colors,
+                                  labels=df.index, value_name='Mean')
+    writeGeoJSON(collection, 'map1.geojson')
+    m = bubbleMap(collection)
+'''
+
+import json
+
+import numpy as np
+
+
+def clusterPoints(lat, lon, values, colors, labels, cell_degrees):
+    '''lat, lon, values = arrays, colors, labels = lists of the same length,
+    cell_degrees = size of the grid cells.
+    Returns the same arrays for the clusters, plus the number of points of
+    each one. A cluster is at the mean position of its points, has their mean
+    value, and the color and label of its highest value point.'''
+    cells = np.stack([np.floor(lat / cell_degrees), np.floor(lon / cell_degrees)], axis=1)
+    _, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    size = inverse.max() + 1 if len(inverse) else 0
+    counts = np.bincount(inverse, minlength=size)
+    mean = lambda a: np.bincount(inverse, weights=a, minlength=size) / counts
+    #Highest value point of each cluster: last of its cluster after sorting by (cluster, value)
+    order = np.lexsort((values, inverse))
+    top = order[np.cumsum(counts) - 1]
+    labels = np.asarray(labels, dtype=object)[top]
+    labels = np.where(counts > 1, [str(l) + ' +{0}'.format(c - 1) for l, c in zip(labels, counts)], labels)
+    return mean(lat), mean(lon), mean(values), np.asarray(colors, dtype=object)[top], labels, counts
+
+
+def bubbleCollection(lat, lon, values, colors, labels=None, value_name='Value', label_name='Country',
+                     scale=1.1, decimals=3, cluster=None):
+    '''lat, lon, values = sequences of the points, colors = one color per point
+    (or a shorter list, used in cycle), labels = names shown in the tooltip,
+    value_name/label_name = names of those properties, scale = circle radius
+    per unit of value (pixels), decimals = decimals of the values,
+    cluster = grid cell size in degrees to merge close points (no clustering by default).
+    Points without a location (NaN) are left out.
+    Returns the GeoJSON FeatureCollection as a dict.'''
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    colors = [colors[i % len(colors)] for i in range(len(values))]
+    labels = [str(l) for l in (range(len(values)) if labels is None else labels)]
+    keep = ~(np.isnan(lat) | np.isnan(lon) | np.isnan(values))
+    lat, lon, values = lat[keep], lon[keep], values[keep]
+    colors = [c.strip() for c, k in zip(colors, keep) if k]
+    labels = [l for l, k in zip(labels, keep) if k]
+    counts = np.ones(len(values), dtype=np.int64)
+    if cluster:
+        lat, lon, values, colors, labels, counts = clusterPoints(lat, lon, values, colors, labels, cluster)
+
+    #Bigger clusters have bigger circles (area proportional to the number of points)
+    radius = np.round(values * scale * np.sqrt(counts), 2)
+    features = [{'type': 'Feature',
+                 'geometry': {'type': 'Point', 'coordinates': [round(x, 4), round(y, 4)]},
+                 'properties': {label_name: l, value_name: round(v, decimals), 'count': int(n),
+                                'color': c, 'radius': r}}
+                for x, y, v, c, l, n, r in zip(lon.tolist(), lat.tolist(), values.tolist(), colors,
+                                               labels, counts.tolist(), radius.tolist())]
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def writeGeoJSON(collection, path):
+    '''Writes the collection without whitespace. Returns the size in bytes.'''
+    text = json.dumps(collection, separators=(',', ':'), ensure_ascii=False)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return len(text.encode('utf-8'))
+
+
+def bubbleStyle(feature):
+    '''The one style function of the map: circle style from the feature properties.'''
+    properties = feature['properties']
+    return {'radius': properties['radius'], 'color': properties['color'], 'opacity': 0.65,
+            'fillColor': properties['color'], 'fillOpacity': 0.6, 'weight': 2}
+
+
+def bubbleMap(collection, label_name='Country', value_name='Value', width=600, height=360,
+              location=(31, 20), zoom_start=1.4, tiles='openstreetmap'):
+    '''Returns a folium map with the collection drawn as one GeoJson layer of
+    circle markers, with a tooltip of the label and the value.'''
+    import folium
+    m = folium.Map(width=width, height=height, location=list(location), tiles=tiles, zoom_start=zoom_start)
+    folium.GeoJson(collection, marker=folium.CircleMarker(), style_function=bubbleStyle,
+                   tooltip=folium.GeoJsonTooltip(fields=[label_name, value_name])).add_to(m)
+    return m
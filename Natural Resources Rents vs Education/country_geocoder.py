@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Country geocoding with an offline centroid table and a persistent cache.
+
+locateAndCreateBubbleMap() in the script asked Nominatim for the location of
+every country, one blocking request at a time, on every call. CountryGeocoder
+looks the countries up in 'country_centroids.csv' first (ISO 3166 alpha-3 code,
+name and an approximate centroid for ~240 countries, taken from the MIT
+licensed countryinfo data), then in an on-disk JSON cache of earlier lookups.
+Only what is in neither is sent to the fetch function, all at once, and the
+answers are added to the cache, so the next maps are built without network.
+
+Usage:
+    from country_geocoder import CountryGeocoder
+    geocoder = CountryGeocoder('Data/geocode_cache.json')
+    locations = geocoder.locateMany(high_edurank_df.index, high_edurank_df['CountryCode'])
+'''
+
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+CENTROIDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'country_centroids.csv')
+#Codes used by the World Development Indicators that are not ISO 3166 alpha-3
+CODE_ALIASES = {'ADO': 'AND', 'KSV': 'XKX', 'ROM': 'ROU', 'TMP': 'TLS', 'WBG': 'PSE', 'ZAR': 'COD'}
+NOMINATIM_URL = 'http://nominatim.openstreetmap.org/search'
+
+
+def normalizeKey(key):
+    '''Lookup key of a country name or code: stripped and case-folded.'''
+    return str(key).strip().casefold()
+
+
+def loadCentroids(path=CENTROIDS_PATH):
+    '''Returns a dict {normalized code or name: (lat, lon)} from a csv file with
+    'CountryCode', 'CountryName', 'lat' and 'lon' columns.'''
+    table = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            location = (float(row['lat']), float(row['lon']))
+            table[normalizeKey(row['CountryCode'])] = location
+            table.setdefault(normalizeKey(row['CountryName']), location)
+    for alias, code in CODE_ALIASES.items():
+        if normalizeKey(code) in table:
+            table.setdefault(normalizeKey(alias), table[normalizeKey(code)])
+    return table
+
+
+def nominatimFetch(names, delay=1.0):
+    '''names = list of country names. Asks Nominatim for each one, at most one
+    request every 'delay' seconds (usage policy of the public server).
+    Returns a list with (lat, lon), or None when the country isn't found.'''
+    import requests
+    locations = []
+    for i, name in enumerate(names):
+        if i:
+            time.sleep(delay)
+        response = requests.get(NOMINATIM_URL, params={'country': name, 'format': 'json', 'polygon': 0},
+                                headers={'User-Agent': 'rents-vs-education'}, timeout=30)
+        response.raise_for_status()
+        found = response.json()
+        locations.append((float(found[0]['lat']), float(found[0]['lon'])) if found else None)
+    return locations
+
+
+class CountryGeocoder():
+    '''Batch country lookups: offline centroid table, then JSON cache, then fetch.'''
+
+    def __init__(self, cache_path=None, centroids=CENTROIDS_PATH, fetch=nominatimFetch, offline=False):
+        '''cache_path = JSON file with earlier lookups (no cache by default),
+        centroids = csv file of the offline table (None to skip it),
+        fetch = function that takes a list of names and returns a list of
+        (lat, lon) or None, offline = never call fetch.'''
+        self.cache_path = cache_path
+        self.table = loadCentroids(centroids) if centroids else {}
+        self.fetch = fetch
+        self.offline = offline
+        self.cache = {}
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, encoding='utf-8') as f:
+                self.cache = json.load(f)
+
+    def _known(self, key):
+        '''Location of a key from the table or the cache. Returns False when the
+        key was never looked up, None when it was looked up and not found.'''
+        key = normalizeKey(key)
+        if key in self.table:
+            return self.table[key]
+        if key in self.cache:
+            return tuple(self.cache[key]) if self.cache[key] else None
+        return False
+
+    def locateMany(self, names, codes=None):
+        '''names = list of country names, codes = list of country codes in the
+        same order (tried first when given).
+        Returns an (n, 2) array of [lat, lon], NaN for countries not found.'''
+        names = [str(n) for n in names]
+        codes = [None] * len(names) if codes is None else [None if c is None else str(c) for c in codes]
+        locations = np.full((len(names), 2), np.nan)
+        missing = {} #Normalized name -> name, each country fetched once
+        for i, (name, code) in enumerate(zip(names, codes)):
+            found = self._known(code) if code else False
+            if not found:
+                found = self._known(name)
+            if found:
+                locations[i] = found
+            elif found is False:
+                missing.setdefault(normalizeKey(name), name)
+
+        if missing and not self.offline and self.fetch:
+            fetched = self.fetch(list(missing.values()))
+            for key, location in zip(missing, fetched):
+                self.cache[key] = list(location) if location else None
+            self.save()
+            for i, name in enumerate(names):
+                if normalizeKey(name) in missing and self.cache[normalizeKey(name)]:
+                    locations[i] = self.cache[normalizeKey(name)]
+        return locations
+
+    def locate(self, name, code=None):
+        '''Returns the (lat, lon) of one country, or None when it isn't found.'''
+        location = self.locateMany([name], None if code is None else [code])[0]
+        return None if np.isnan(location).any() else (float(location[0]), float(location[1]))
+
+    def save(self):
+        '''Writes the cache to cache_path (replaced atomically).'''
+        if not self.cache_path:
+            return
+        folder = os.path.dirname(self.cache_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        temporary = self.cache_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, sort_keys=True)
+        os.replace(temporary, self.cache_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Locate countries by name or code')
+    parser.add_argument('countries', nargs='+', help='country names or ISO alpha-3 codes')
+    parser.add_argument('--cache', default=None, help='JSON cache file')
+    parser.add_argument('--offline', action='store_true', help='never ask Nominatim')
+    args = parser.parse_args()
+
+    geocoder = CountryGeocoder(args.cache, offline=args.offline)
+    for country, (lat, lon) in zip(args.countries, geocoder.locateMany(args.countries)):
+        print('{0}: {1:.4f}, {2:.4f}'.format(country, lat, lon))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''equalYearsMeans() must rank like the groupby version of the script.
+
+    python -m pytest test_wdi_rank.py
+'''
+
+import numpy as np
+import pandas as pd
+
+from wdi_rank import equalYearsMeans
+
+
+def test_rows_without_country_are_left_out():
+    df = pd.DataFrame({'CountryName': ['A', 'A', 'A', None, 'B', 'B', np.nan, 'C'],
+                       'CountryCode': ['AAA', 'AAA', 'AAA', 'XXX', 'BBB', 'BBB', 'YYY', 'CCC'],
+                       'Value': [1.0, 5.0, 3.0, 100.0, 2.0, np.nan, 50.0, 9.0]})
+    rankings = equalYearsMeans(df, 'CountryName', ['CountryCode', 'Value'], [1, 2, 3])
+    assert list(rankings[1].index) == ['C', 'A', 'B']
+    assert rankings[2].loc['A', 'Value'] == 4.0 #Mean of the 2 highest values
+    assert rankings[2].loc['B', 'Value'] == 2.0 #NaN values are not averaged
+    assert list(rankings[3].index) == ['A']
+    assert rankings[1]['CountryCode'].tolist() == ['CCC', 'AAA', 'BBB']
@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Vectorized correlation engine for the World Development Indicators.
+
+correlation() in the notebook filters the whole dataframe once per country to
+correlate two indicators over the years the country has both. Here the two
+indicators are pivoted once into aligned (country x year) matrices and the
+correlations of every country are computed in a single pass with NaN masks,
+together with the number of shared years.
+
+screenIndicators() tests the same hypothesis for every pair of indicators of
+the catalog, for one country or a panel of countries. The correlations are
+computed block by block with matrix products over NaN-masked data, the blocks
+are spread over worker processes and only the pairs that pass the thresholds
+are streamed to a csv file, so the full indicators x indicators result is
+never held in memory. The standardized observation matrix is written once,
+block by block, to a temporary .npy file that every worker memory-maps
+read-only, so the workers share one copy of it.
+
+Usage:
+    from wdi_corr import correlateAll
+    table = correlateAll(focused_df,
+                         'Government expenditure on education as % of GDP (%)',
+                         'Total natural resources rents (% of GDP)',
+                         method='both')
+
+    python wdi_corr.py Data/cube --country Canada --out pairs_canada.csv --min-overlap 15
+'''
+
+import argparse
+import csv
+import heapq
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+def pivotIndicators(df, variable1, variable2):
+    '''df = long dataframe with 'CountryName', 'IndicatorName', 'Year' and 'Value',
+    or an IndicatorCube. Returns two (country x year) dataframes with the same
+    index and columns, NaN where a country has no data for that year.'''
+    if hasattr(df, 'matrix'): #IndicatorCube, the matrices are already aligned
+        return df.matrix(variable1), df.matrix(variable2)
+    rows = df[df['IndicatorName'].isin([variable1, variable2])]
+    wide = rows.pivot_table(values='Value', index='CountryName',
+                            columns=['IndicatorName', 'Year'], observed=True)
+    years = sorted(set(rows['Year']))
+    x = wide[variable1].reindex(columns=years) if variable1 in wide else None
+    y = wide[variable2].reindex(columns=years) if variable2 in wide else None
+    if x is None or y is None:
+        empty = pd.DataFrame(index=wide.index, columns=years, dtype=float)
+        x, y = (empty if x is None else x), (empty if y is None else y)
+    return x, y
+
+
+def maskedPearson(x, y):
+    '''x, y = (rows x observations) float arrays with NaN for missing values.
+    Returns the Pearson correlation of each row over the observations both have,
+    and the number of those observations. Rows with fewer than 2 shared
+    observations (or no variation) get NaN.'''
+    mask = ~np.isnan(x) & ~np.isnan(y)
+    n = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x = np.where(mask, x, 0).sum(axis=1) / n
+        mean_y = np.where(mask, y, 0).sum(axis=1) / n
+        dx = np.where(mask, x - mean_x[:, None], 0)
+        dy = np.where(mask, y - mean_y[:, None], 0)
+        r = (dx * dy).sum(axis=1) / np.sqrt((dx * dx).sum(axis=1) * (dy * dy).sum(axis=1))
+    r[n < 2] = np.nan
+    return r, n
+
+
+def sharedRanks(x, y):
+    '''Ranks (average ranks for ties) of x and y within each row, using only
+    the observations both have. Returns two float arrays with NaN elsewhere.'''
+    mask = ~np.isnan(x) & ~np.isnan(y)
+    x_ranks = pd.DataFrame(np.where(mask, x, np.nan)).rank(axis=1).values
+    y_ranks = pd.DataFrame(np.where(mask, y, np.nan)).rank(axis=1).values
+    return x_ranks, y_ranks
+
+
+def correlateAll(df, variable1, variable2, method='pearson', min_years=2):
+    '''df = long dataframe or IndicatorCube, variable1/variable2 = indicator names,
+    method = 'pearson', 'spearman' or 'both', min_years = minimum shared years.
+    Returns a dataframe indexed by country with the correlation(s) and the
+    number of shared years ('years'), for every country at once. Countries
+    with fewer than min_years shared years stay in the table with NaN
+    correlations, like correlation() in the notebook.'''
+    x, y = pivotIndicators(df, variable1, variable2)
+    xv, yv = x.values.astype(np.float64), y.values.astype(np.float64)
+    table = pd.DataFrame(index=x.index)
+    if method in ('pearson', 'both'):
+        table['pearson'], years = maskedPearson(xv, yv)
+    if method in ('spearman', 'both'):
+        table['spearman'], years = maskedPearson(*sharedRanks(xv, yv))
+    if method not in ('pearson', 'spearman', 'both'):
+        raise ValueError("method must be 'pearson', 'spearman' or 'both'")
+    table['years'] = years
+    table.loc[table['years'] < min_years, table.columns != 'years'] = np.nan
+    return table
+
+
+def standardizeRows(matrix):
+    '''Centers and scales each row over its own observations. The pairwise
+    correlations don't change (they are invariant to a linear change of each
+    row) but the sums of squares of the block products stay well conditioned.'''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(matrix, axis=1, keepdims=True)
+        scale = np.nanstd(matrix, axis=1, keepdims=True)
+        scale[~(scale > 0)] = 1
+        return (matrix - mean) / scale
+
+
+def blockCorrelation(a, b):
+    '''a, b = (indicators x observations) blocks with NaN for missing values.
+    Returns the (len(a) x len(b)) Pearson correlations over the observations
+    each pair shares, and the number of those observations.'''
+    mask_a, mask_b = ~np.isnan(a), ~np.isnan(b)
+    a0, b0 = np.where(mask_a, a, 0), np.where(mask_b, b, 0)
+    ma, mb = mask_a.astype(np.float64), mask_b.astype(np.float64)
+    n = ma @ mb.T
+    sum_a, sum_b = a0 @ mb.T, ma @ b0.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cov = a0 @ b0.T - sum_a * sum_b / n
+        var_a = (a0 * a0) @ mb.T - sum_a ** 2 / n
+        var_b = ma @ (b0 * b0).T - sum_b ** 2 / n
+        r = cov / np.sqrt(var_a * var_b)
+    r[(n < 2) | ~(var_a > 1e-12 * n) | ~(var_b > 1e-12 * n)] = np.nan
+    return np.clip(r, -1, 1), n.astype(np.int64)
+
+
+def writeStandardized(cube, countries, path, block_size=256):
+    '''Writes the standardized (indicators x observations) matrix of the
+    countries (see IndicatorCube.observations()) to the .npy file at path,
+    block_size indicators at a time, so the whole matrix is never in memory.'''
+    size = len(cube.indicator_names)
+    width = cube.observations(countries, slice(0, 0)).shape[1]
+    out = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(size, width))
+    for start in range(0, size, block_size):
+        rows = slice(start, min(start + block_size, size))
+        out[rows] = standardizeRows(cube.observations(countries, rows))
+    out.flush()
+    del out
+
+
+_matrix = None #Standardized observation matrix of each worker process, memory-mapped
+
+
+def _initWorker(path):
+    '''Maps the standardized matrix written by writeStandardized(), read-only.'''
+    global _matrix
+    _matrix = np.load(path, mmap_mode='r')
+
+
+def _screenBlock(task):
+    '''Correlates rows [i0, i1) with rows [j0, j1) of the worker matrix.
+    Returns the (i, j, r, n) arrays of the pairs that pass the thresholds.'''
+    i0, i1, j0, j1, min_overlap, min_abs_r = task
+    r, n = blockCorrelation(_matrix[i0:i1], _matrix[j0:j1])
+    i, j = np.meshgrid(np.arange(i0, i1), np.arange(j0, j1), indexing='ij')
+    keep = (n >= min_overlap) & (np.abs(r) >= min_abs_r) & (i < j) #Upper triangle only
+    return i[keep], j[keep], r[keep], n[keep]
+
+
+def screenIndicators(cube, countries=None, out_path=None, min_overlap=10, min_abs_r=0.5,
+                     top=100, block_size=256, workers=None):
+    '''cube = IndicatorCube, countries = one country, a list of countries (pooled
+    panel) or None for all countries,
+    out_path = csv file where every pair that passes the thresholds is written
+    as soon as its block is done (nothing is written by default),
+    min_overlap = minimum shared observations, min_abs_r = minimum |correlation|,
+    top = number of pairs returned, block_size = indicators per block,
+    workers = number of processes (one per cpu by default).
+    Returns a dataframe with the top pairs by |correlation|.'''
+    global _matrix
+    size = len(cube.indicator_names)
+    starts = list(range(0, size, block_size))
+    tasks = [(i0, min(i0 + block_size, size), j0, min(j0 + block_size, size), min_overlap, min_abs_r)
+             for i0 in starts for j0 in starts if j0 >= i0]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+    best = [] #Heap of (|r|, i, j, r, n) with the top pairs seen so far
+    scratch = tempfile.TemporaryDirectory()
+    out = open(out_path, 'w', newline='') if out_path else None
+    pool = None
+    try:
+        path = os.path.join(scratch.name, 'standardized.npy')
+        writeStandardized(cube, countries, path, block_size)
+        writer = csv.writer(out) if out else None
+        if writer:
+            writer.writerow(['Indicator1', 'Indicator2', 'r', 'n'])
+        if workers == 1:
+            _initWorker(path)
+            results = map(_screenBlock, tasks)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(path,))
+            results = pool.map(_screenBlock, tasks)
+        for i, j, r, n in results:
+            if writer:
+                writer.writerows(zip(np.array(cube.indicator_names)[i],
+                                     np.array(cube.indicator_names)[j],
+                                     np.round(r, 6), n))
+            for item in zip(np.abs(r), i, j, r, n):
+                if len(best) < top:
+                    heapq.heappush(best, item)
+                elif item[0] > best[0][0]:
+                    heapq.heapreplace(best, item)
+    finally:
+        _matrix = None #Release the mapping before the file is removed
+        if pool:
+            pool.shutdown()
+        if out:
+            out.close()
+        scratch.cleanup()
+
+    best.sort(reverse=True)
+    names = cube.indicator_names
+    return pd.DataFrame([(names[i], names[j], r, n) for _, i, j, r, n in best],
+                        columns=['Indicator1', 'Indicator2', 'r', 'n'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='All-pairs indicator correlation screening')
+    parser.add_argument('cube', help='folder of a cube saved with wdi_cube.py')
+    parser.add_argument('--country', nargs='*', default=None,
+                        help='one country (or several for a pooled panel), all by default')
+    parser.add_argument('--out', default=None, help='csv file for every pair passing the thresholds')
+    parser.add_argument('--min-overlap', type=int, default=10)
+    parser.add_argument('--min-abs-r', type=float, default=0.5)
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--block-size', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    from wdi_cube import IndicatorCube
+    cube = IndicatorCube.load(args.cube)
+    countries = args.country[0] if args.country and len(args.country) == 1 else args.country
+    pd.set_option('display.max_colwidth', 60)
+    print(screenIndicators(cube, countries, args.out, args.min_overlap, args.min_abs_r,
+                           args.top, args.block_size, args.workers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Pre-built (indicator, country, year) index of the World Development Indicators.
+
+The analysis keeps filtering the long dataframe with boolean masks over string
+columns ('IndicatorName == ...', 'CountryName.isin(...)', 'Year == 2013').
+IndicatorCube stores the values once in a dense NumPy array of shape
+(indicators, countries, years), with NaN where there is no data, plus
+dictionaries from names and codes to positions. A slice for an indicator, a
+country or a year is then a direct array lookup instead of a scan of the rows.
+The cube is saved to a folder and memory-mapped when loaded.
+
+Usage:
+    from wdi_cube import IndicatorCube
+    cube = IndicatorCube.fromCSV('Data/Indicators.csv')  #one time, all indicators
+    cube.save('Data/cube')
+    cube = IndicatorCube.load('Data/cube')
+    edu_df = cube.frame('Government expenditure on education as % of GDP (%)')
+'''
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from wdi_loader import COLUMNS, loadIndicators
+
+
+class IndicatorCube():
+    '''Dense cube of values indexed by (indicator, country, year).'''
+
+    def __init__(self, values, indicator_names, indicator_codes,
+                 country_names, country_codes, first_year):
+        self.values = values
+        self.indicator_names = list(indicator_names)
+        self.indicator_codes = list(indicator_codes)
+        self.country_names = list(country_names)
+        self.country_codes = list(country_codes)
+        self.years = np.arange(first_year, first_year + values.shape[2])
+        self.folder = None #Set by load()
+        #Names and codes both point to the same position
+        self.indicator_index = dict(zip(self.indicator_names, range(len(self.indicator_names))))
+        self.indicator_index.update(zip(self.indicator_codes, range(len(self.indicator_codes))))
+        self.country_index = dict(zip(self.country_names, range(len(self.country_names))))
+        self.country_index.update(zip(self.country_codes, range(len(self.country_codes))))
+        self.year_index = dict(zip(self.years.tolist(), range(len(self.years))))
+
+    @classmethod
+    def fromFrame(cls, df):
+        '''df = long dataframe with the COLUMNS of Indicators.csv. Returns the cube.'''
+        indicators = df[['IndicatorName', 'IndicatorCode']].drop_duplicates('IndicatorName')
+        indicators = indicators.sort_values('IndicatorName')
+        countries = df[['CountryName', 'CountryCode']].drop_duplicates('CountryName')
+        countries = countries.sort_values('CountryName')
+        first_year, last_year = int(df['Year'].min()), int(df['Year'].max())
+
+        i = pd.Index(indicators['IndicatorName'].astype(str)).get_indexer(df['IndicatorName'].astype(str))
+        c = pd.Index(countries['CountryName'].astype(str)).get_indexer(df['CountryName'].astype(str))
+        values = np.full((len(indicators), len(countries), last_year - first_year + 1), np.nan)
+        values[i, c, df['Year'].values - first_year] = df['Value'].values
+        return cls(values, indicators['IndicatorName'].astype(str), indicators['IndicatorCode'].astype(str),
+                   countries['CountryName'].astype(str), countries['CountryCode'].astype(str), first_year)
+
+    @classmethod
+    def fromCSV(cls, path='Data/Indicators.csv', indicators=None, years=None):
+        '''Builds the cube straight from the csv file (see wdi_loader.loadIndicators()).'''
+        return cls.fromFrame(loadIndicators(path, indicators, years))
+
+    def save(self, folder):
+        '''Saves the values (.npy) and the labels (.json) in folder.'''
+        os.makedirs(folder, exist_ok=True)
+        np.save(os.path.join(folder, 'values.npy'), np.ascontiguousarray(self.values))
+        labels = {'indicator_names': self.indicator_names, 'indicator_codes': self.indicator_codes,
+                  'country_names': self.country_names, 'country_codes': self.country_codes,
+                  'first_year': int(self.years[0])}
+        with open(os.path.join(folder, 'labels.json'), 'w') as f:
+            json.dump(labels, f)
+
+    @classmethod
+    def load(cls, folder, mmap=True):
+        '''Loads a saved cube. With mmap the values are memory-mapped, read-only.'''
+        with open(os.path.join(folder, 'labels.json')) as f:
+            labels = json.load(f)
+        values = np.load(os.path.join(folder, 'values.npy'), mmap_mode='r' if mmap else None)
+        cube = cls(values, **labels)
+        cube.folder = folder
+        return cube
+
+    def indicator(self, name):
+        '''Position of an indicator, by name or code.'''
+        return self.indicator_index[name]
+
+    def country(self, name):
+        '''Position of a country, by name or code.'''
+        return self.country_index[name]
+
+    def year(self, year):
+        '''Position of a year, KeyError for the years outside the cube.'''
+        return self.year_index[int(year)]
+
+    def _countries(self, countries):
+        if countries is None:
+            return np.arange(len(self.country_names))
+        return np.array([self.country(c) for c in countries], dtype=int)
+
+    def _years(self, years):
+        if years is None:
+            return np.arange(len(self.years))
+        return np.array([self.year(y) for y in years], dtype=int)
+
+    def matrix(self, indicator, countries=None, years=None):
+        '''Returns the (countries, years) values of one indicator as a dataframe.'''
+        c, y = self._countries(countries), self._years(years)
+        values = self.values[self.indicator(indicator)][np.ix_(c, y)]
+        return pd.DataFrame(values, index=pd.Index(np.array(self.country_names)[c], name='CountryName'),
+                            columns=pd.Index(self.years[y], name='Year'))
+
+    def frame(self, indicators, countries=None, years=None):
+        '''indicators = one indicator or a list of them (names or codes),
+        countries and years = lists to keep (all by default).
+        Returns the long dataframe (the COLUMNS of Indicators.csv) of the
+        values that exist, like filtering the original rows with masks.
+        Used for getEqualYearsMean() and the FacetGrid plots.'''
+        if isinstance(indicators, str):
+            indicators = [indicators]
+        ind = np.array([self.indicator(i) for i in indicators], dtype=int)
+        c, y = self._countries(countries), self._years(years)
+        block = self.values[np.ix_(ind, c, y)]
+        i_pos, c_pos, y_pos = np.nonzero(~np.isnan(block))
+        return pd.DataFrame({
+            'CountryName': np.array(self.country_names)[c[c_pos]],
+            'CountryCode': np.array(self.country_codes)[c[c_pos]],
+            'IndicatorName': np.array(self.indicator_names)[ind[i_pos]],
+            'IndicatorCode': np.array(self.indicator_codes)[ind[i_pos]],
+            'Year': self.years[y[y_pos]],
+            'Value': block[i_pos, c_pos, y_pos],
+        }, columns=COLUMNS)
+
+    def yearsOfData(self, indicator):
+        '''Returns the number of years with data per country, sorted in
+        descending order (same as value_counts() on the filtered rows).'''
+        counts = (~np.isnan(self.values[self.indicator(indicator)])).sum(axis=1)
+        series = pd.Series(counts, index=pd.Index(self.country_names, name='CountryName'),
+                           name='count')
+        return series[series > 0].sort_values(ascending=False, kind='mergesort')
+
+    def observations(self, countries=None, indicators=slice(None)):
+        '''countries = one country, a list of countries (a panel) or None for all,
+        indicators = slice of indicator positions (all by default).
+        Returns an (indicators x observations) array: the years of one country,
+        or the (country, year) pairs of a panel one after the other.'''
+        if isinstance(countries, str):
+            return np.asarray(self.values[indicators, self.country(countries), :], dtype=np.float64)
+        c = self._countries(countries)
+        block = np.asarray(self.values[indicators][:, c, :], dtype=np.float64)
+        return block.reshape(block.shape[0], block.shape[1] * block.shape[2])
+
+    def pair(self, country, variable1, variable2):
+        '''Returns the years where a country has both indicators, and the two
+        arrays of values for those years.'''
+        c = self.country(country)
+        a = self.values[self.indicator(variable1), c]
+        b = self.values[self.indicator(variable2), c]
+        shared = ~np.isnan(a) & ~np.isnan(b)
+        return self.years[shared], a[shared], b[shared]
+
+    def correlation(self, country, variable1, variable2):
+        '''The correlation of two indicators over the years a country has both,
+        rounded to 5 decimals (wdi_corr.maskedPearson() on the country's row).'''
+        from wdi_corr import maskedPearson
+        c = self.country(country)
+        r, _ = maskedPearson(self.values[self.indicator(variable1), c][None],
+                             self.values[self.indicator(variable2), c][None])
+        return round(float(r[0]), 5)
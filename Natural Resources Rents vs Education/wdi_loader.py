@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Selective loader for the World Development Indicators dataset.
+
+'Data/Indicators.csv' has millions of rows but every study only needs a few
+indicators. loadIndicators() streams the file in chunks and keeps only the rows
+of the requested indicators (by name or code) and years, so memory and load
+time depend on the selection and not on the size of the dump.
+
+Usage:
+    from wdi_loader import loadIndicators
+    focused_df = loadIndicators('Data/Indicators.csv',
+                                ['Total natural resources rents (% of GDP)', 'SE.XPD.TOTL.GD.ZS'],
+                                years=(1970, 2014))
+'''
+
+import pandas as pd
+
+COLUMNS = ['CountryName', 'CountryCode', 'IndicatorName', 'IndicatorCode', 'Year', 'Value']
+CATEGORY_COLUMNS = ['CountryName', 'CountryCode', 'IndicatorName', 'IndicatorCode']
+DTYPES = {'Year': 'int16', 'Value': 'float64'}
+
+
+def indicatorCatalog(path='Data/Indicators.csv', chunksize=1000000):
+    '''Returns a dataframe with every (IndicatorName, IndicatorCode) pair of the
+    dataset and its number of rows. Only the two indicator columns are read.'''
+    counts = []
+    for chunk in pd.read_csv(path, usecols=['IndicatorName', 'IndicatorCode'], chunksize=chunksize):
+        counts.append(chunk.value_counts(['IndicatorName', 'IndicatorCode']))
+    if not counts:
+        return pd.DataFrame(columns=['IndicatorName', 'IndicatorCode', 'Rows'])
+    catalog = pd.concat(counts).groupby(level=[0, 1]).sum()
+    return catalog.rename('Rows').reset_index().sort_values('IndicatorName', ignore_index=True)
+
+
+def loadIndicators(path='Data/Indicators.csv', indicators=None, years=None,
+                   chunksize=500000, categorical=True):
+    '''path = csv file, indicators = list of indicator names and/or codes (all by default),
+    years = (first, last) years to keep, both included (all by default),
+    chunksize = rows read at a time,
+    categorical = store the name and code columns as categoricals.
+    Returns a dataframe with the matching rows only. The index keeps the row
+    numbers of the csv file, as if the whole file had been read and filtered.'''
+    wanted = None if indicators is None else set(indicators)
+    selected = []
+    for chunk in pd.read_csv(path, usecols=COLUMNS, dtype=DTYPES, chunksize=chunksize):
+        mask = pd.Series(True, index=chunk.index)
+        if years is not None:
+            mask &= chunk['Year'].between(years[0], years[1])
+        if wanted is not None:
+            mask &= chunk['IndicatorName'].isin(wanted) | chunk['IndicatorCode'].isin(wanted)
+        if mask.any():
+            chunk = chunk[mask]
+            if categorical:
+                #Converting each chunk keeps the strings of the selection only
+                chunk = chunk.astype({c: 'category' for c in CATEGORY_COLUMNS})
+            selected.append(chunk)
+
+    if not selected:
+        empty = pd.DataFrame(columns=COLUMNS).astype(DTYPES)
+        return empty.astype({c: 'category' for c in CATEGORY_COLUMNS}) if categorical else empty
+    if not categorical:
+        return pd.concat(selected)[COLUMNS]
+    #Align the categories of every chunk before joining them
+    for c in CATEGORY_COLUMNS:
+        categories = pd.api.types.union_categoricals([s[c] for s in selected]).categories
+        for s in selected:
+            s[c] = s[c].cat.set_categories(categories)
+    return pd.concat(selected)[COLUMNS]
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Equal-years ranking of countries, for one or many thresholds.
+
+getEqualYearsMean() in the script keeps the countries with at least
+'threshold' years of data, takes the 'threshold' highest values of each one and
+ranks the countries by the mean of those values. It sorts and copies the whole
+dataframe on every call. Here the rows are sorted once (by country, then by
+value in descending order) and cumulative sums give the mean of the top N
+values of every country for any N, so a sweep over many thresholds costs a
+single sort.
+
+Usage:
+    from wdi_rank import equalYearsMeans
+    rankings = equalYearsMeans(edu_df, 'CountryName', ['CountryCode', 'Value'], range(5, 51))
+    rankings[30].head(10)
+'''
+
+import numpy as np
+import pandas as pd
+
+
+class _SortedGroups():
+    '''Rows sorted by group and by value (descending, NaN last) with the
+    cumulative sums needed to average the top N values of each group.'''
+
+    def __init__(self, df, index_col, value_cols):
+        keys, self.groups = pd.factorize(df[index_col], sort=True)
+        values = df[value_cols[1]].to_numpy(dtype=np.float64)
+        labels = df[value_cols[0]].to_numpy()
+        #Rows without an item (NaN key, -1) are left out, like groupby() does
+        known = keys >= 0
+        if not known.all():
+            keys, values, labels = keys[known], values[known], labels[known]
+        #One sort for every threshold: by group, then highest values first (NaN last)
+        order = np.lexsort((np.where(np.isnan(values), np.inf, -values), keys))
+        values, labels = values[order], labels[order]
+
+        self.counts = np.bincount(keys, minlength=len(self.groups)) #Rows per group, NaN included
+        self.starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+        self.labels = labels[self.starts] if len(labels) else labels #value_cols[0] of each group
+        valid = ~np.isnan(values)
+        self.value_sums = np.concatenate([[0], np.cumsum(np.where(valid, values, 0))])
+        self.valid_counts = np.concatenate([[0], np.cumsum(valid)])
+
+    def ranking(self, threshold, index_col, value_cols):
+        '''Returns the ranked dataframe for one threshold.'''
+        groups = np.flatnonzero(self.counts >= threshold)
+        first, last = self.starts[groups], self.starts[groups] + threshold
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = ((self.value_sums[last] - self.value_sums[first])
+                     / (self.valid_counts[last] - self.valid_counts[first]))
+        order = np.argsort(np.where(np.isnan(means), np.inf, -means), kind='mergesort')
+        groups = groups[order]
+        return pd.DataFrame({value_cols[0]: self.labels[groups], value_cols[1]: means[order]},
+                            index=pd.Index(np.asarray(self.groups)[groups], name=index_col))
+
+
+def equalYearsMeans(df, index_col, value_cols, thresholds):
+    '''df = dataframe, index_col = column of the items to rank (countries),
+    value_cols = [label column to keep, value column to average],
+    thresholds = list of amounts of years.
+    Returns a dict {threshold: ranked dataframe}, each the same as
+    getEqualYearsMean(df, index_col, value_cols, threshold).'''
+    groups = _SortedGroups(df, index_col, value_cols)
+    return {t: groups.ranking(t, index_col, value_cols) for t in thresholds}
+
+
+def getEqualYearsMean(df, index_col, value_cols, threshold):
+    '''Same arguments and result as getEqualYearsMean() in the script:
+    countries with at least threshold years, ranked by the mean of their
+    threshold highest values.'''
+    return equalYearsMeans(df, index_col, value_cols, [threshold])[threshold]
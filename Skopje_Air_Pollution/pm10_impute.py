@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Vectorized imputation of the missing PM10 readings of the stations.
+
+The notebook fills each gap with the average of the same hour in the same
+month ('replacements'), building one list per station with a MultiIndex
+.loc lookup for every timestamp. Here the (month, hour) profile is computed
+once as a (12, 24, stations) array and the fill values of every row and every
+station come from a single gather: profile[month - 1, hour].
+
+Strategies:
+- 'mean': average of the same month and hour (the notebook method);
+- 'median': median of the same month and hour;
+- 'linear': linear interpolation in time between the readings around the gap;
+- 'seasonal': the month-hour mean plus the deviation from it, interpolated in
+  time (follows the daily cycle while keeping the level around the gap).
+Gaps that can't be interpolated (before the first or after the last reading)
+get the month-hour mean. Other strategies can be added to STRATEGIES.
+
+Usage:
+    from pm10_impute import fillGaps
+    skopje_data_winters = fillGaps(skopje_data_winters, ['A', 'B', 'C', 'D', 'E', 'G'])
+
+fillValues() does the same on arrays, PM10Store.fillGaps() uses it on the
+rows of a store.
+'''
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def timeKeys(times):
+    '''times = datetime Series or array. Returns the months (1-12), the hours
+    (0-23) and the int64 epoch nanoseconds.'''
+    times = pd.DatetimeIndex(times)
+    return times.month.values, times.hour.values, times.values.astype('datetime64[ns]').astype(np.int64)
+
+
+def monthHourProfile(values, months, hours, statistic='mean', decimals=4):
+    '''values = (rows, stations) float array with NaN for missing readings,
+    months = 1 to 12, hours = 0 to 23, statistic = 'mean' or 'median',
+    decimals = rounding of the profile (the notebook uses .round(4)).
+    Returns a (12, 24, stations) array, NaN where a station has no readings.'''
+    values = np.asarray(values, dtype=np.float64).reshape(len(months), -1)
+    cell = (np.asarray(months) - 1) * 24 + np.asarray(hours)
+    stations = values.shape[1]
+    if statistic not in ('mean', 'median'):
+        raise ValueError("statistic must be 'mean' or 'median'")
+    #One groupby over the 288 cells, the same sums as groupby([month, hour]) in the notebook
+    grouped = pd.DataFrame(values).groupby(cell)
+    profile = getattr(grouped, statistic)().reindex(range(288)).values
+    profile = profile.reshape(12, 24, stations)
+    return profile.round(decimals) if decimals is not None else profile
+
+
+def interpolateColumns(values, epoch):
+    '''Linear interpolation in time of each column over its missing values.
+    Values before the first or after the last reading stay NaN.'''
+    filled = values.copy()
+    for j in range(values.shape[1]):
+        column = values[:, j]
+        valid = ~np.isnan(column)
+        if valid.sum() < 2:
+            continue
+        inside = ~valid & (epoch > epoch[valid][0]) & (epoch < epoch[valid][-1])
+        filled[inside, j] = np.interp(epoch[inside], epoch[valid], column[valid])
+    return filled
+
+
+def _profileFill(statistic):
+    def fill(values, months, hours, epoch, profile, decimals):
+        if profile is None or statistic != 'mean':
+            profile = monthHourProfile(values, months, hours, statistic, decimals)
+        return profile[months - 1, hours]
+    return fill
+
+
+def _linearFill(values, months, hours, epoch, profile, decimals):
+    return interpolateColumns(values, epoch)
+
+
+def _seasonalFill(values, months, hours, epoch, profile, decimals):
+    if profile is None:
+        profile = monthHourProfile(values, months, hours, 'mean', decimals)
+    expected = profile[months - 1, hours]
+    return expected + interpolateColumns(values - expected, epoch)
+
+
+#strategy -> function(values, months, hours, epoch, mean profile or None, decimals)
+#returning the (rows, stations) fill values
+STRATEGIES = {
+    'mean': _profileFill('mean'),
+    'median': _profileFill('median'),
+    'linear': _linearFill,
+    'seasonal': _seasonalFill,
+}
+
+
+def fillValues(values, months, hours, epoch, strategy='mean', profile=None, decimals=4):
+    '''values = (rows, stations) float array with NaN for missing readings,
+    months, hours and epoch as in timeKeys(), strategy, profile and decimals
+    as in fillGaps(). Returns the filled float64 array, the readings that
+    exist are kept as they are (NaN only where a station has no readings).'''
+    values = np.asarray(values, dtype=np.float64)
+    months, hours = np.asarray(months, dtype=np.int64), np.asarray(hours, dtype=np.int64)
+    if profile is None:
+        profile = monthHourProfile(values, months, hours, 'mean', decimals)
+    fill = STRATEGIES[strategy] if isinstance(strategy, str) else strategy
+    filled = fill(values, months, hours, epoch, profile, decimals)
+
+    #Whatever the strategy left empty gets the month-hour mean
+    missing = np.isnan(filled)
+    if missing.any():
+        filled = np.where(missing, profile[months - 1, hours], filled)
+    return np.where(np.isnan(values), filled, values)
+
+
+def fillGaps(df, columns, time_col='time', strategy='mean', profile=None, decimals=4):
+    '''df = dataframe with a datetime column, columns = station columns,
+    time_col = name of the datetime column, strategy = a key of STRATEGIES or
+    a function with the same arguments, profile = (12, 24, stations) month-hour
+    means to use instead of the ones of df (e.g. from a longer archive),
+    decimals = rounding of the profile.
+    Returns a copy of df with the missing values of the columns filled, the
+    readings that exist are kept as they are.'''
+    months, hours, epoch = timeKeys(df[time_col])
+    filled = fillValues(df[columns].to_numpy(dtype=np.float64), months, hours, epoch,
+                        strategy, profile, decimals)
+    df = df.copy()
+    df[columns] = filled
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fill the missing PM10 readings')
+    parser.add_argument('path', help="csv file with the station columns and a 'time' column")
+    parser.add_argument('--out', default=None, help='csv file for the filled data')
+    parser.add_argument('--strategy', choices=sorted(STRATEGIES), default='mean')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path, parse_dates=['time'])
+    columns = [c for c in df.columns if c != 'time']
+    start = time.perf_counter()
+    filled = fillGaps(df, columns, strategy=args.strategy)
+    print('Filled {:,} readings in {:.3f} s'.format(int(df[columns].isna().sum().sum())
+                                                     - int(filled[columns].isna().sum().sum()),
+                                                     time.perf_counter() - start))
+    if args.out:
+        filled.to_csv(args.out, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Compact typed store of the hourly PM10 readings of many stations.
+
+pd.read_csv('pm10_data.csv') gives float64 station columns and a string 'time'
+column that is parsed again with pd.to_datetime, and every monthly summary
+(month_group, top_station_months) formats all the rows with
+dt.strftime('%B') only to build the group keys. PM10Store keeps:
+
+- epoch: int64 nanoseconds since the epoch, one per row;
+- values: (rows, stations) float32 readings, 0 where a reading is missing;
+- valid: validity bitmap, (rows, ceil(stations / 8)) uint8 from np.packbits;
+- month (1-12) and hour (0-23): uint8 keys computed once when the store is built.
+
+The arrays are saved as .npy files in a folder, with the size and
+modification time of the csv file they come from, and memory-mapped when
+loaded; loadOrConvert() converts the csv again when it changed. Monthly,
+hourly and per-station means are np.bincount reductions over the keys (sums
+of the values and counts of the valid bits), read by blocks of rows so the
+whole array is never converted to float64. Medians gather the rows of each
+group. A selection of rows (rows()) is a bool mask, and fillGaps() fills the
+missing readings of a selection in place, in copy-on-write pages of the
+mapped files (the files are never changed). Readings are float32, so the
+results can differ from the float64 csv values in the 7th significant digit.
+
+Usage:
+    from pm10_store import PM10Store
+    store = PM10Store.loadOrConvert('pm10_data.csv', 'pm10_store', writable=True)
+    winters = store.rows(start='2013-11-01', months=[11, 12, 1, 2])
+    store.fillGaps(winters)
+    store.monthly('median', winters), store.hourly(rows=winters), store.stationMeans(winters)
+    skopje_data_winters = store.frame(rows=winters)
+
+    python pm10_store.py pm10_data.csv pm10_store
+'''
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+FILES = ['epoch', 'values', 'valid', 'month', 'hour']
+BLOCK = 1 << 16 #Rows per block in the reductions
+
+
+class PM10Store():
+    '''Hourly readings as typed arrays with a validity bitmap and month/hour keys.'''
+
+    def __init__(self, epoch, values, valid, month, hour, stations):
+        self.epoch = epoch
+        self.values = values
+        self.valid = valid
+        self.month = month
+        self.hour = hour
+        self.stations = list(stations)
+        self.folder = None #Set by load()
+        self.source = None #Size and modification time of the csv file, set by fromCSV()
+
+    def __len__(self):
+        return len(self.epoch)
+
+    @classmethod
+    def fromArrays(cls, times, values, stations):
+        '''times = datetimes of the rows, values = (rows, stations) readings with
+        NaN for missing ones. Returns the store.'''
+        times = pd.DatetimeIndex(times)
+        values = np.asarray(values, dtype=np.float32).reshape(len(times), -1)
+        mask = ~np.isnan(values)
+        return cls(times.values.astype('datetime64[ns]').astype(np.int64),
+                   np.where(mask, values, np.float32(0)),
+                   np.packbits(mask, axis=1),
+                   times.month.values.astype(np.uint8),
+                   times.hour.values.astype(np.uint8), stations)
+
+    @classmethod
+    def fromFrame(cls, df, stations=None, time_col='time'):
+        '''df = dataframe with a datetime column and one column per station
+        (every other column by default). Returns the store.'''
+        stations = stations or [c for c in df.columns if c != time_col]
+        return cls.fromArrays(df[time_col], df[stations].to_numpy(dtype=np.float32), stations)
+
+    @classmethod
+    def fromCSV(cls, path, time_col='time', chunksize=500000):
+        '''Reads the csv file by chunks, the station columns straight as float32
+        and the time column parsed once. Returns the store.'''
+        source = sourceStamp(path)
+        stations = [c for c in pd.read_csv(path, nrows=0).columns if c != time_col]
+        parts = [cls.fromFrame(chunk, stations, time_col)
+                 for chunk in pd.read_csv(path, chunksize=chunksize, parse_dates=[time_col],
+                                          dtype={s: np.float32 for s in stations})]
+        if parts:
+            store = cls(*[np.concatenate([getattr(p, name) for p in parts]) for name in FILES], stations)
+        else:
+            store = cls.fromArrays([], np.zeros((0, len(stations))), stations)
+        store.source = source
+        return store
+
+    def save(self, folder):
+        '''Saves the arrays (.npy) and the station names and source stamp
+        (.json, written last so an interrupted save is never taken as valid).'''
+        os.makedirs(folder, exist_ok=True)
+        info_path = os.path.join(folder, 'stations.json')
+        if os.path.exists(info_path):
+            os.remove(info_path)
+        for name in FILES:
+            np.save(os.path.join(folder, name + '.npy'), np.ascontiguousarray(getattr(self, name)))
+        with open(info_path, 'w') as f:
+            json.dump({'stations': self.stations, 'rows': len(self), 'source': self.source}, f)
+
+    @classmethod
+    def load(cls, folder, mmap=True, writable=False):
+        '''Loads a saved store. With mmap the arrays are memory-mapped, read-only,
+        or copy-on-write with writable (changes stay in memory, see fillGaps()).'''
+        with open(os.path.join(folder, 'stations.json')) as f:
+            info = json.load(f)
+        mode = ('c' if writable else 'r') if mmap else None
+        arrays = [np.load(os.path.join(folder, name + '.npy'), mmap_mode=mode) for name in FILES]
+        store = cls(*arrays, info['stations'])
+        store.folder = folder
+        store.source = info.get('source')
+        return store
+
+    @classmethod
+    def loadOrConvert(cls, path, folder, mmap=True, writable=False):
+        '''Loads the store in folder when it was made from the current csv file
+        (same size and modification time), otherwise converts the csv file
+        again and saves it to folder first.'''
+        info_path = os.path.join(folder, 'stations.json')
+        saved = None
+        if os.path.exists(info_path):
+            with open(info_path) as f:
+                saved = json.load(f).get('source')
+        if saved != sourceStamp(path):
+            cls.fromCSV(path).save(folder)
+        return cls.load(folder, mmap, writable)
+
+    def _stations(self, stations):
+        if stations is None:
+            return np.arange(len(self.stations))
+        return np.array([self.stations.index(s) for s in stations], dtype=int)
+
+    def mask(self, start=0, stop=None):
+        '''Returns the (rows, stations) bool validity of rows start to stop.'''
+        return np.unpackbits(self.valid[start:stop], axis=1, count=len(self.stations)).astype(bool)
+
+    def rows(self, start=None, end=None, months=None, start_inclusive=True):
+        '''start, end = datetimes (end excluded), months = month numbers to keep,
+        start_inclusive = keep the rows at start (False for time > start).
+        Returns a bool array of the selected rows.'''
+        selected = np.ones(len(self), dtype=bool)
+        if start is not None:
+            start = pd.Timestamp(start).as_unit('ns').value
+            selected &= (self.epoch >= start) if start_inclusive else (self.epoch > start)
+        if end is not None:
+            selected &= self.epoch < pd.Timestamp(end).as_unit('ns').value
+        if months is not None:
+            selected &= np.isin(self.month, np.asarray(months, dtype=np.uint8))
+        return selected
+
+    def times(self, rows=None):
+        '''Returns the DatetimeIndex of the rows.'''
+        epoch = self.epoch if rows is None else self.epoch[rows]
+        return pd.DatetimeIndex(np.asarray(epoch).astype('datetime64[ns]'))
+
+    def _index(self, rows):
+        '''Positions of the rows: all by default, a bool mask or positions.'''
+        if rows is None:
+            return np.arange(len(self))
+        rows = np.asarray(rows)
+        return np.flatnonzero(rows) if rows.dtype == bool else rows
+
+    def frame(self, stations=None, rows=None, time_col='time', dtype=np.float64):
+        '''rows = bool array (or positions) of the rows to use (all by default),
+        dtype = type of the station columns (float64 like pd.read_csv, the
+        stored values are float32). Returns the readings as a dataframe, NaN
+        where missing, with the time column, like the csv file.'''
+        columns = self._stations(stations)
+        rows = self._index(rows)
+        values = np.asarray(self.values[rows][:, columns], dtype=dtype)
+        mask = np.unpackbits(self.valid[rows], axis=1, count=len(self.stations)).astype(bool)[:, columns]
+        df = pd.DataFrame(np.where(mask, values, np.nan).astype(dtype), columns=[self.stations[c] for c in columns])
+        df[time_col] = self.times(rows)
+        return df
+
+    def fillGaps(self, rows=None, strategy='mean', profile=None, decimals=4):
+        '''Fills the missing readings of the rows (a bool array, all by default)
+        in place with pm10_impute.fillValues(): strategy, profile and decimals
+        as in pm10_impute.fillGaps(), computed on these rows only. A loaded
+        store must be loaded with writable=True, the files are not changed.
+        Returns the number of readings filled.'''
+        from pm10_impute import fillValues
+        if not (self.values.flags.writeable and self.valid.flags.writeable):
+            raise ValueError('The store is read-only, load it with writable=True')
+        index = self._index(rows)
+        mask = np.unpackbits(self.valid[index], axis=1, count=len(self.stations)).astype(bool)
+        values = np.where(mask, np.asarray(self.values[index], dtype=np.float64), np.nan)
+        filled = fillValues(values, self.month[index], self.hour[index], self.epoch[index],
+                            strategy, profile, decimals)
+        valid = ~np.isnan(filled)
+        self.values[index] = np.where(valid, filled, 0).astype(np.float32)
+        self.valid[index] = np.packbits(valid, axis=1)
+        return int((valid & ~mask).sum())
+
+    def missingCounts(self, rows=None):
+        '''Returns the number of missing readings of each station, like isna().sum().'''
+        _, counts = self._sums(None, 1, rows)
+        total = len(self) if rows is None else int(np.count_nonzero(rows))
+        return pd.Series(total - counts[0], index=self.stations)
+
+    def _sums(self, keys, size, rows=None):
+        '''Sums of the values and counts of the valid readings per (key, station),
+        by blocks of rows. keys = None sums every row into one group.'''
+        n = len(self.stations)
+        sums = np.zeros(size * n)
+        counts = np.zeros(size * n, dtype=np.int64)
+        columns = np.arange(n)
+        for start in range(0, len(self), BLOCK):
+            stop = min(start + BLOCK, len(self))
+            values = np.asarray(self.values[start:stop], dtype=np.float64)
+            mask = self.mask(start, stop)
+            block_keys = np.zeros(stop - start, dtype=np.int64) if keys is None else keys[start:stop].astype(np.int64)
+            if rows is not None:
+                selected = rows[start:stop]
+                values, mask, block_keys = values[selected], mask[selected], block_keys[selected]
+            cells = (block_keys[:, None] * n + columns).ravel()
+            sums += np.bincount(cells, weights=values.ravel(), minlength=size * n)
+            counts += np.bincount(cells[mask.ravel()], minlength=size * n)
+        return sums.reshape(size, n), counts.reshape(size, n)
+
+    def _means(self, keys, size, rows=None):
+        sums, counts = self._sums(keys, size, rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts, counts
+
+    def _medians(self, keys, size, rows=None):
+        medians = np.full((size, len(self.stations)), np.nan)
+        counts = np.zeros((size, len(self.stations)), dtype=np.int64)
+        selected = np.ones(len(self), dtype=bool) if rows is None else rows
+        for key in range(size):
+            group = np.flatnonzero(selected & (keys == key))
+            if not len(group):
+                continue
+            mask = np.unpackbits(self.valid[group], axis=1, count=len(self.stations)).astype(bool)
+            values = np.where(mask, np.asarray(self.values[group], dtype=np.float64), np.nan)
+            counts[key] = mask.sum(axis=0)
+            with np.errstate(invalid='ignore'):
+                medians[key] = np.nanmedian(values, axis=0) if mask.any() else np.nan
+        return medians, counts
+
+    def _grouped(self, keys, size, statistic, rows):
+        if statistic not in ('mean', 'median'):
+            raise ValueError("statistic must be 'mean' or 'median'")
+        reduce = self._means if statistic == 'mean' else self._medians
+        return reduce(keys, size, rows)
+
+    def monthly(self, statistic='mean', rows=None):
+        '''statistic = 'mean' or 'median', rows = bool array of the rows to use
+        (see rows()). Returns a dataframe indexed by month name, in calendar
+        order (groupby on strftime('%B') sorts the names alphabetically), with
+        only the months that have readings.'''
+        result, counts = self._grouped(self.month.astype(np.int64) - 1, 12, statistic, rows)
+        present = counts.sum(axis=1) > 0
+        return pd.DataFrame(result[present], columns=self.stations,
+                            index=pd.Index(np.array(MONTHS)[present], name='time'))
+
+    def hourly(self, statistic='mean', rows=None):
+        '''Same as monthly() for the hours of the day (0-23).'''
+        result, counts = self._grouped(self.hour, 24, statistic, rows)
+        present = counts.sum(axis=1) > 0
+        return pd.DataFrame(result[present], columns=self.stations,
+                            index=pd.Index(np.arange(24)[present], name='hour'))
+
+    def stationMeans(self, rows=None):
+        '''Returns the mean reading of each station.'''
+        means, _ = self._means(None, 1, rows)
+        return pd.Series(means[0], index=self.stations)
+
+    def nbytes(self):
+        '''Size of the arrays in bytes.'''
+        return sum(getattr(self, name).nbytes for name in FILES)
+
+
+def sourceStamp(path):
+    '''Returns the size and modification time of a file.'''
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert the PM10 csv file to a memory-mapped store')
+    parser.add_argument('path', help="csv file with the station columns and a 'time' column")
+    parser.add_argument('folder', help='folder of the store')
+    args = parser.parse_args()
+
+    store = PM10Store.loadOrConvert(args.path, args.folder)
+    df = pd.read_csv(args.path)
+    print('Rows: {:,}, stations: {}'.format(len(store), len(store.stations)))
+    print('Store: {:,} bytes, dataframe: {:,} bytes'.format(store.nbytes(), int(df.memory_usage(deep=True).sum())))
+
+    df['time'] = pd.to_datetime(df['time'])
+    start = time.perf_counter()
+    expected = df.groupby(df['time'].dt.strftime('%B')).mean()
+    frame_time = time.perf_counter() - start
+    start = time.perf_counter()
+    monthly = store.monthly()
+    store_time = time.perf_counter() - start
+    print('Monthly means: strftime groupby {:.3f} s, store {:.3f} s'.format(frame_time, store_time))
+    print('Largest difference:', float(np.nanmax(np.abs(monthly - expected.loc[monthly.index]).values)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Online PM10 monitoring: daily maxima, exceedance days and rolling means.
+
+number_of_days() in the notebook filters the whole dataframe, groups it by
+(year, month, day) and counts again for every threshold. ExceedanceMonitor
+takes the hourly readings one timestamp at a time, as they arrive, and keeps
+for every station:
+- the maximum of the current day;
+- the number of days above each of the configured thresholds (a day counts
+  as soon as one reading is strictly above the threshold, as in the notebook);
+- the mean of the last 24 hours, from a ring buffer of hourly slots;
+- the history of the daily maxima, to answer "days above X" for any other X.
+Every reading costs O(stations) work, nothing is regrouped.
+
+Usage:
+    from pm10_stream import ExceedanceMonitor
+    monitor = ExceedanceMonitor(['A', 'B', 'C', 'D', 'E', 'G'], thresholds=(50, 200))
+    monitor.update('2018-01-05 14:00', [61.2, None, 80.5, 240.1, 45.0, 99.9])
+    monitor.daysAbove(50), monitor.daysAbove(120), monitor.rollingMean()
+
+    python pm10_stream.py pm10_data.csv --thresholds 50 200
+'''
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+HOUR = 3600 * 10 ** 9 #Nanoseconds
+DAY = 24 * HOUR
+
+
+class ExceedanceMonitor():
+    '''Running daily and rolling statistics of hourly readings per station.'''
+
+    def __init__(self, stations, thresholds=(50, 200), window_hours=24):
+        '''stations = names of the stations, thresholds = PM10 limits counted
+        on every reading, window_hours = length of the rolling mean.'''
+        self.stations = list(stations)
+        self.thresholds = [float(t) for t in thresholds]
+        self.window_hours = window_hours
+        size = len(self.stations)
+
+        self.day = None #Current day (days since the epoch)
+        self.last_time = None
+        self.day_max = np.full(size, np.nan)
+        self.counts = np.zeros((len(self.thresholds), size), dtype=np.int64)
+        self.exceeded = np.zeros((len(self.thresholds), size), dtype=bool) #Already counted today
+
+        #Ring buffer of the last window_hours hours
+        self.slot_hours = np.full(window_hours, -1, dtype=np.int64)
+        self.slot_values = np.zeros((window_hours, size))
+        self.slot_valid = np.zeros((window_hours, size), dtype=bool)
+        self.window_sums = np.zeros(size)
+        self.window_counts = np.zeros(size, dtype=np.int64)
+
+        #Daily maxima of the finished days, grown by doubling
+        self.history_days = np.zeros(64, dtype=np.int64)
+        self.history_max = np.full((64, size), np.nan)
+        self.history_size = 0
+
+    def _closeDay(self):
+        '''Moves the maxima of the current day to the history.'''
+        if self.history_size == len(self.history_days):
+            self.history_days = np.concatenate([self.history_days, np.zeros_like(self.history_days)])
+            self.history_max = np.concatenate([self.history_max, np.full_like(self.history_max, np.nan)])
+        self.history_days[self.history_size] = self.day
+        self.history_max[self.history_size] = self.day_max
+        self.history_size += 1
+        self.day_max[:] = np.nan
+        self.exceeded[:] = False
+
+    def _evict(self, slot):
+        '''Removes the readings of a slot from the window sums.'''
+        valid = self.slot_valid[slot]
+        self.window_sums[valid] -= self.slot_values[slot, valid]
+        self.window_counts -= valid
+        self.slot_valid[slot] = False
+        self.slot_hours[slot] = -1
+
+    def update(self, time, values):
+        '''time = timestamp of the readings, values = one reading per station
+        (NaN or None when missing). Readings must arrive in time order; a new
+        reading for the same hour replaces the previous one in the rolling mean.'''
+        now = pd.Timestamp(time).as_unit('ns').value
+        if self.last_time is not None and now < self.last_time:
+            raise ValueError('Readings must arrive in time order')
+        self.last_time = now
+        values = np.array(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+
+        day = now // DAY
+        if self.day is None:
+            self.day = day
+        elif day != self.day:
+            self._closeDay()
+            self.day = day
+
+        #Daily maximum and exceedance counters
+        self.day_max = np.fmax(self.day_max, values)
+        for t, threshold in enumerate(self.thresholds):
+            crossed = (self.day_max > threshold) & ~self.exceeded[t]
+            self.counts[t] += crossed
+            self.exceeded[t] |= crossed
+
+        #Rolling window: clear the slots that left the window, then store the hour
+        hour = now // HOUR
+        stale = (self.slot_hours >= 0) & (self.slot_hours <= hour - self.window_hours)
+        for slot in np.flatnonzero(stale):
+            self._evict(slot)
+        slot = hour % self.window_hours
+        if self.slot_hours[slot] != hour:
+            self._evict(slot)
+            self.slot_hours[slot] = hour
+        else:
+            #Same hour again: drop the previous readings of the stations that report now
+            replaced = self.slot_valid[slot] & valid
+            self.window_sums[replaced] -= self.slot_values[slot, replaced]
+            self.window_counts -= replaced
+        self.slot_values[slot, valid] = values[valid]
+        self.window_sums[valid] += values[valid]
+        self.window_counts += valid
+        self.slot_valid[slot] |= valid
+
+    def updateFrame(self, df, time_col='time'):
+        '''Feeds every row of a dataframe with the station columns, in time order.'''
+        times = pd.DatetimeIndex(df[time_col])
+        values = df[self.stations].to_numpy(dtype=np.float64)
+        for time, row in zip(times, values):
+            self.update(time, row)
+        return self
+
+    def daysAbove(self, threshold):
+        '''Returns the number of days with at least one reading above threshold,
+        per station, the current day included. Configured thresholds are read
+        from the counters, others from the history of daily maxima.'''
+        if float(threshold) in self.thresholds:
+            counts = self.counts[self.thresholds.index(float(threshold))]
+        else:
+            history = self.history_max[:self.history_size]
+            counts = (history > threshold).sum(axis=0) + (self.day_max > threshold)
+        return pd.Series(counts, index=self.stations, name='days above {0:g}'.format(threshold))
+
+    def rollingMean(self):
+        '''Returns the mean of the readings of the last window_hours hours, per station.'''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.window_sums / self.window_counts
+        return pd.Series(means, index=self.stations, name='{0}h mean'.format(self.window_hours))
+
+    def dailyMax(self):
+        '''Returns the maximum reading of the current day, per station.'''
+        return pd.Series(self.day_max, index=self.stations, name='daily max')
+
+    def dailyMaxHistory(self):
+        '''Returns a dataframe of the daily maxima of every day seen, the current one included.'''
+        days = np.append(self.history_days[:self.history_size], [] if self.day is None else [self.day])
+        maxima = self.history_max[:self.history_size]
+        if self.day is not None:
+            maxima = np.vstack([maxima, self.day_max[None, :]])
+        return pd.DataFrame(maxima, columns=self.stations,
+                            index=pd.to_datetime(days * DAY).rename('day'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay PM10 readings through the online monitor')
+    parser.add_argument('path', help="csv file with the station columns and a 'time' column")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[50, 200])
+    parser.add_argument('--window', type=int, default=24, help='hours of the rolling mean')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.path, parse_dates=['time'])
+    monitor = ExceedanceMonitor([c for c in df.columns if c != 'time'], args.thresholds, args.window)
+    monitor.updateFrame(df)
+    print(pd.DataFrame([monitor.daysAbove(t) for t in args.thresholds]).T)
+    print(monitor.rollingMean())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Benchmark of the tweet featurization.
+
+Compares bag_of_words() as written in the notebook (regexes compiled on the
+fly, a new TweetTokenizer per tweet, stopword lookups in a list, no stem cache)
+with TweetFeaturizer.bag(), and checks that both give the same bags.
+
+Usage:
+    python bench_features.py                    #tweets of 'Spiderman Tweets' and 'Aquaman Tweets'
+    python bench_features.py my_tweets.csv --times 20
+'''
+
+import argparse
+import re
+import string
+import time
+
+import pandas as pd
+
+from tweet_features import EMOTICONS, TweetFeaturizer
+
+
+def notebookBagOfWords(stopwords_english):
+    '''Returns bag_of_words() as written in the notebook.'''
+    from nltk.stem import PorterStemmer
+    from nltk.tokenize import TweetTokenizer
+    stemmer = PorterStemmer()
+    emoticons = set(EMOTICONS)
+
+    def cleanAndTokenizeTweets(tweet):
+        tweet = re.sub(r'\$\w*', '', tweet)
+        tweet = re.sub(r'^RT[\s]+', '', tweet)
+        tweet = re.sub(r'https?:\/\/.*[\r\n]*', '', tweet)
+        tweet = re.sub(r'#', '', tweet)
+        tokenizer = TweetTokenizer(preserve_case=False, strip_handles=True, reduce_len=True)
+        tweet_tokens = tokenizer.tokenize(tweet)
+        tweets_clean = []
+        for word in tweet_tokens:
+            if (word not in stopwords_english and
+                    word not in emoticons and
+                    word not in string.punctuation):
+                tweets_clean.append(stemmer.stem(word))
+        return tweets_clean
+
+    def bag_of_words(tweet):
+        words = cleanAndTokenizeTweets(tweet)
+        return dict([word, True] for word in words)
+
+    return bag_of_words
+
+
+def timed(func, tweets):
+    '''Returns the bags of words of the tweets and the time it took.'''
+    start = time.perf_counter()
+    bags = [func(tweet) for tweet in tweets]
+    return bags, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the tweet featurization')
+    parser.add_argument('paths', nargs='*', default=['Spiderman Tweets', 'Aquaman Tweets'],
+                        help="csv files with a 'Text' column")
+    parser.add_argument('--times', type=int, default=10, help='times the tweets are repeated')
+    args = parser.parse_args()
+
+    from nltk.corpus import stopwords
+    stopwords_english = stopwords.words('english')
+    tweets = pd.concat([pd.read_csv(p)['Text'] for p in args.paths]).dropna().tolist() * args.times
+
+    old, old_time = timed(notebookBagOfWords(stopwords_english), tweets)
+    featurizer = TweetFeaturizer(stopwords_english)
+    new, new_time = timed(featurizer.bag, tweets)
+    print('Tweets: {:,}'.format(len(tweets)))
+    print('Notebook bag_of_words: {:.3f} s'.format(old_time))
+    print('TweetFeaturizer.bag:   {:.3f} s ({:.1f}x)'.format(new_time, old_time / new_time))
+    print('Stem cache:', featurizer.cacheInfo())
+    print('Same bags:', old == new)
+
+
+if __name__ == '__main__':
+    main()
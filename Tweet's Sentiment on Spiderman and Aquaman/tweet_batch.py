@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Batch sentiment classification of tweet files.
+
+The notebook classifies 'Spiderman Tweets' and then 'Aquaman Tweets' with a
+Python loop of classifier.classify(bag), one tweet at a time, in one process.
+classifyFiles() takes any number of csv files, reads them in chunks and sends
+the chunks of all the files, split in up to one piece per worker, to a single
+pool of worker processes. Each worker loads the model and its featurizer
+once, when it starts: the CompiledNB (see nb_compiled.py) saved in a model
+file of tweet_model.py, or a pickled classifier compiled on the spot. A whole
+piece is scored with one sparse matrix product. Only the texts and the labels
+travel between processes. The labels of every row and the sentiment counts of
+every file are written as csv files.
+
+At most 2 pieces per worker are in flight, so memory doesn't grow with the
+size of the files. The files don't wait for each other: the next file is
+read while the pieces of the previous one are still being scored, and the
+labels of each file are written in row order.
+
+Usage:
+    from tweet_model import loadOrTrain
+    loadOrTrain('sentiment_model.bin', featurizer)      #trains only when the corpus or featurizer changed
+    counts = classifyFiles(['Spiderman Tweets', 'Aquaman Tweets'], 'sentiment_model.bin', out_dir='labels')
+
+    python tweet_batch.py sentiment_model.bin 'Spiderman Tweets' 'Aquaman Tweets' --out labels
+'''
+
+import argparse
+import os
+import pickle
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from nb_compiled import CompiledNB
+from tweet_model import loadModel, readHeader
+
+MIN_TASK = 500 #Fewest tweets sent to a worker at a time, when a chunk is split
+_compiled = None #Compiled classifier and featurizer of each worker process
+_featurizer = None
+
+
+def loadClassifier(path):
+    '''Loads a model file of tweet_model.py, a pickled classifier or a pickled
+    (classifier, featurizer) pair. Returns (classifier, featurizer), with the
+    default TweetFeaturizer when the pickle has none.'''
+    if readHeader(path) is not None:
+        model = loadModel(path, ('featurizer', 'classifier'))
+        return model['classifier'], model['featurizer']
+    with open(path, 'rb') as f:
+        model = pickle.load(f)
+    if isinstance(model, tuple):
+        return model
+    from tweet_features import TweetFeaturizer
+    return model, TweetFeaturizer()
+
+
+def loadScorer(path):
+    '''Returns (CompiledNB, featurizer). A model file of tweet_model.py has
+    both ready, a pickled classifier is compiled.'''
+    if readHeader(path) is not None:
+        model = loadModel(path)
+        return model['scorer'], model['featurizer']
+    classifier, featurizer = loadClassifier(path)
+    return CompiledNB(classifier), featurizer
+
+
+def _initWorker(model_path):
+    global _compiled, _featurizer
+    _compiled, _featurizer = loadScorer(model_path)
+
+
+def _classifyTexts(texts):
+    '''Returns the label of each text.'''
+    return _compiled.classifyTexts(texts, _featurizer)
+
+
+class _InlinePool():
+    '''Runs the tasks in the calling process, for workers=1.'''
+
+    def __init__(self, model_path):
+        _initWorker(model_path)
+
+    def submit(self, func, *args):
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def outputNames(paths):
+    '''Returns the name of the labels file of each path: '<file>.labels.csv',
+    with the folders of the path ('data__2019__<file>') when files of the same
+    name come from different folders.'''
+    names = [os.path.basename(os.path.normpath(p)) for p in paths]
+    repeated = {n for n in names if names.count(n) > 1}
+    if repeated:
+        root = os.path.commonpath([os.path.abspath(p) for p in paths])
+        names = ['__'.join(os.path.relpath(os.path.abspath(p), root).split(os.sep)) if n in repeated else n
+                 for p, n in zip(paths, names)]
+    return [n + '.labels.csv' for n in names]
+
+
+def classifyFiles(paths, model_path, out_dir=None, chunksize=10000, workers=None,
+                  text_col='Text', id_col='ID'):
+    '''paths = csv files with a text column, model_path = model file or
+    pickled classifier (see loadScorer()), out_dir = folder for the labels
+    files (row, ID and Sentiment of every tweet, see outputNames()) and
+    'sentiment_counts.csv' (nothing is written by default), chunksize = tweets
+    read at a time, workers = number of processes (one per cpu by default),
+    text_col/id_col = names of the text and id columns.
+    Returns a dataframe with the number of tweets of each label per file.'''
+    paths = list(dict.fromkeys(paths))
+    workers = workers or os.cpu_count() or 1
+    out_paths = [None] * len(paths)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+        out_paths = [os.path.join(out_dir, name) for name in outputNames(paths)]
+        for out_path in out_paths:
+            if os.path.exists(out_path):
+                os.remove(out_path)
+    if workers == 1:
+        pool = _InlinePool(model_path)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_initWorker, initargs=(model_path,))
+
+    counts = {path: Counter() for path in paths}
+    #One queue for all the files: (path, out_path, rows, future) in file and row order
+    pending = deque()
+
+    def collect():
+        path, out_path, rows, future = pending.popleft()
+        labels = future.result()
+        counts[path].update(labels)
+        if out_path:
+            rows = rows.assign(Sentiment=labels)
+            rows.to_csv(out_path, mode='a', header=not os.path.exists(out_path), index_label='row')
+
+    try:
+        for path, out_path in zip(paths, out_paths):
+            for chunk in pd.read_csv(path, chunksize=chunksize):
+                #Split the chunk so that a small file still keeps every worker busy
+                pieces = max(1, min(workers, -(-len(chunk) // MIN_TASK)))
+                size = -(-len(chunk) // pieces)
+                for start in range(0, len(chunk), size):
+                    piece = chunk.iloc[start:start + size]
+                    texts = piece[text_col].fillna('').astype(str).tolist()
+                    rows = piece[[id_col]] if id_col in piece else piece[[]]
+                    pending.append((path, out_path, rows, pool.submit(_classifyTexts, texts)))
+                    if len(pending) >= 2 * workers:
+                        collect()
+        while pending:
+            collect()
+    finally:
+        pool.shutdown()
+
+    table = pd.DataFrame(counts).T.fillna(0).astype(int)
+    table.index.name = 'File'
+    if out_dir:
+        table.to_csv(os.path.join(out_dir, 'sentiment_counts.csv'))
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sentiment classification of tweet files')
+    parser.add_argument('model', help='model file of tweet_model.py, or pickled classifier')
+    parser.add_argument('paths', nargs='+', help='csv files of tweets')
+    parser.add_argument('--out', default=None, help='folder for the labels and the counts')
+    parser.add_argument('--chunksize', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--text-col', default='Text')
+    args = parser.parse_args()
+
+    print(classifyFiles(args.paths, args.model, args.out, args.chunksize, args.workers, args.text_col))
+
+
+if __name__ == '__main__':
+    main()
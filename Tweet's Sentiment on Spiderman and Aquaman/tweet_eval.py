@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Streaming evaluation of the sentiment classifier.
+
+The notebook keeps a set of test indices per label for precision(), recall()
+and f_measure(), plus two parallel lists of labels for ConfusionMatrix, so the
+memory grows with the test set. ConfusionCounter keeps only an integer
+(labels x labels) matrix, updated batch by batch, and derives precision,
+recall, F-measure and the pretty confusion table from it, with the same
+values and layout as nltk.metrics.
+
+crossValidate() runs a k-fold cross-validation: the folds are trained and
+scored in parallel worker processes, each fold returns its ConfusionCounter
+and the counters are added up.
+
+Usage:
+    from tweet_eval import ConfusionCounter, evaluate, crossValidate
+    counter = evaluate(compiled.classifyMany, test_set)
+    counter.precision('pos'), counter.recall('pos'), counter.fMeasure('pos')
+    print(counter.prettyFormat(sort_by_count=True, show_percents=True, truncate=9))
+    total, folds = crossValidate(pos_tweets_set + neg_tweets_set, k=10)
+'''
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+class ConfusionCounter():
+    '''Integer confusion matrix, rows = reference labels, columns = predicted labels.'''
+
+    def __init__(self, labels=()):
+        '''labels = known labels (more are added as they appear).'''
+        self.labels = []
+        self.index = {}
+        self.matrix = np.zeros((0, 0), dtype=np.int64)
+        self._addLabels(labels)
+
+    def _addLabels(self, labels):
+        new = [l for l in dict.fromkeys(labels) if l not in self.index]
+        if not new:
+            return
+        for label in new:
+            self.index[label] = len(self.labels)
+            self.labels.append(label)
+        size = len(self.labels)
+        matrix = np.zeros((size, size), dtype=np.int64)
+        matrix[:self.matrix.shape[0], :self.matrix.shape[1]] = self.matrix
+        self.matrix = matrix
+
+    def update(self, reference, predicted):
+        '''Adds a batch of (reference, predicted) label pairs.'''
+        reference, predicted = list(reference), list(predicted)
+        if len(reference) != len(predicted):
+            raise ValueError('Lists must have the same length.')
+        self._addLabels(reference + predicted)
+        rows = np.fromiter((self.index[l] for l in reference), dtype=np.int64, count=len(reference))
+        cols = np.fromiter((self.index[l] for l in predicted), dtype=np.int64, count=len(predicted))
+        size = len(self.labels)
+        self.matrix += np.bincount(rows * size + cols, minlength=size * size).reshape(size, size)
+        return self
+
+    def merge(self, other):
+        '''Adds the counts of another ConfusionCounter.'''
+        self._addLabels(other.labels)
+        positions = [self.index[l] for l in other.labels]
+        self.matrix[np.ix_(positions, positions)] += other.matrix
+        return self
+
+    def toDict(self):
+        '''Returns the labels and the matrix as a JSON-serializable dict.'''
+        return {'labels': list(self.labels), 'matrix': self.matrix.tolist()}
+
+    @classmethod
+    def fromDict(cls, state):
+        '''Returns the ConfusionCounter of a toDict() dict.'''
+        counter = cls(state['labels'])
+        counter.matrix[:] = np.asarray(state['matrix'], dtype=np.int64)
+        return counter
+
+    @property
+    def total(self):
+        return int(self.matrix.sum())
+
+    def accuracy(self):
+        '''Share of correct predictions, like nltk.classify.accuracy().'''
+        return float(np.trace(self.matrix)) / self.total if self.total else 0.0
+
+    def precision(self, label):
+        '''Same as nltk precision(actual_set[label], predicted_set[label]):
+        None when the label was never predicted.'''
+        i = self.index.get(label)
+        predicted = int(self.matrix[:, i].sum()) if i is not None else 0
+        return int(self.matrix[i, i]) / predicted if predicted else None
+
+    def recall(self, label):
+        '''Same as nltk recall(actual_set[label], predicted_set[label]):
+        None when the label isn't in the reference.'''
+        i = self.index.get(label)
+        actual = int(self.matrix[i].sum()) if i is not None else 0
+        return int(self.matrix[i, i]) / actual if actual else None
+
+    def fMeasure(self, label, alpha=0.5):
+        '''Same as nltk f_measure(): harmonic mean of precision and recall,
+        weighted by alpha.'''
+        p, r = self.precision(label), self.recall(label)
+        if p is None or r is None:
+            return None
+        if p == 0 or r == 0:
+            return 0
+        return 1.0 / (alpha / p + (1 - alpha) / r)
+
+    def report(self, labels=None, decimals=4):
+        '''Returns the precision, recall and F-measure lines of the notebook for each label.'''
+        lines = []
+        for label in labels or sorted(self.labels, reverse=True):
+            for name, value in (('precision', self.precision(label)), ('recall', self.recall(label)),
+                                ('F-measure', self.fMeasure(label))):
+                value = 'None' if value is None else '{0} %'.format(round(round(value, decimals) * 100, 2))
+                lines.append('{0} {1}: {2}'.format(label, name, value))
+        return '\n'.join(lines)
+
+    def prettyFormat(self, show_percents=False, values_in_chart=True, truncate=None, sort_by_count=False):
+        '''Same table as ConfusionMatrix(reference, predicted).pretty_format().'''
+        seen = self.matrix.sum(axis=0) + self.matrix.sum(axis=1) > 0
+        values = sorted(l for l in self.labels if seen[self.index[l]])
+        if sort_by_count:
+            values = sorted(values, key=lambda v: -self.matrix[self.index[v]].sum())
+        if truncate:
+            values = values[:truncate]
+        value_strings = ['%s' % v for v in values] if values_in_chart else [str(n + 1) for n in range(len(values))]
+
+        valuelen = max(len(v) for v in value_strings)
+        value_format = '%' + repr(valuelen) + 's | '
+        if show_percents:
+            entrylen, entry_format, zerostr = 6, '%5.1f%%', '     .'
+        else:
+            entrylen = len(repr(int(self.matrix.max())))
+            entry_format = '%' + repr(entrylen) + 'd'
+            zerostr = ' ' * (entrylen - 1) + '.'
+
+        s = ''
+        for i in range(valuelen):
+            s += (' ' * valuelen) + ' |'
+            for val in value_strings:
+                if i >= valuelen - len(val):
+                    s += val[i - valuelen + len(val)].rjust(entrylen + 1)
+                else:
+                    s += ' ' * (entrylen + 1)
+            s += ' |\n'
+        line = '{0}-+-{1}+\n'.format('-' * valuelen, '-' * ((entrylen + 1) * len(values)))
+        s += line
+        for val, li in zip(value_strings, values):
+            i = self.index[li]
+            s += value_format % val
+            for lj in values:
+                j = self.index[lj]
+                count = int(self.matrix[i, j])
+                if count == 0:
+                    s += zerostr
+                elif show_percents:
+                    s += entry_format % (100.0 * count / self.total)
+                else:
+                    s += entry_format % count
+                if i == j:
+                    prevspace = s.rfind(' ')
+                    s = s[:prevspace] + '<' + s[prevspace + 1:] + '>'
+                else:
+                    s += ' '
+            s += '|\n'
+        s += line
+        s += '(row = reference; col = test)\n'
+        if not values_in_chart:
+            s += 'Value key:\n'
+            for i, value in enumerate(values):
+                s += '%6d: %s\n' % (i + 1, value)
+        return s
+
+
+def evaluate(classify_many, labeled, batch_size=10000, counter=None):
+    '''classify_many = function returning the labels of a list of featuresets
+    (CompiledNB.classifyMany or classifier.classify_many), labeled = iterable of
+    (featureset, label), read batch by batch. Returns the ConfusionCounter.'''
+    counter = counter or ConfusionCounter()
+    batch = []
+    for item in labeled:
+        batch.append(item)
+        if len(batch) == batch_size:
+            counter.update([l for _, l in batch], classify_many([f for f, _ in batch]))
+            batch = []
+    if batch:
+        counter.update([l for _, l in batch], classify_many([f for f, _ in batch]))
+    return counter
+
+
+_labeled = None #Labeled featuresets and folds of each worker process
+_folds = None
+
+
+def _initWorker(labeled, folds):
+    global _labeled, _folds
+    _labeled, _folds = labeled, folds
+
+
+def _evaluateFold(k):
+    '''Trains on every fold but k and returns the ConfusionCounter of fold k.'''
+    from nltk import NaiveBayesClassifier
+    from nb_compiled import CompiledNB
+    train = [_labeled[i] for j, fold in enumerate(_folds) if j != k for i in fold]
+    compiled = CompiledNB(NaiveBayesClassifier.train(train))
+    return evaluate(compiled.classifyMany, (_labeled[i] for i in _folds[k]))
+
+
+def crossValidate(labeled, k=10, workers=None, seed=0):
+    '''labeled = list of (featureset, label), k = number of folds,
+    workers = number of processes (one per cpu by default), seed = shuffle seed.
+    Returns the ConfusionCounter of all the folds together and the list of
+    the counters of each fold.'''
+    folds = [fold.tolist() for fold in np.array_split(np.random.default_rng(seed).permutation(len(labeled)), k)]
+    workers = min(workers or os.cpu_count() or 1, k)
+    if workers == 1:
+        _initWorker(labeled, folds)
+        counters = [_evaluateFold(i) for i in range(k)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initWorker,
+                                 initargs=(labeled, folds)) as pool:
+            counters = list(pool.map(_evaluateFold, range(k)))
+    total = ConfusionCounter()
+    for counter in counters:
+        total.merge(counter)
+    return total, counters
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Reusable tweet tokenizer and bag-of-words featurizer.
+
+Same output as cleanAndTokenizeTweets() and bag_of_words() in the notebook,
+without their per-tweet costs:
+- the regular expressions are compiled once;
+- the TweetTokenizer is built once instead of once per tweet;
+- stopwords, emoticons and punctuation are frozensets, so each check is a hash
+  lookup instead of a scan of the stopwords list;
+- the stems are memoized in an LRU cache, tweets use the same few thousand
+  words over and over.
+
+'word not in string.punctuation' in the notebook is a substring test (it also
+drops tokens like '()' or '-.'); PUNCTUATION holds every substring of
+string.punctuation so the frozenset test drops exactly the same tokens.
+
+A TweetFeaturizer can be pickled (the cache and the tokenizer are rebuilt),
+so it can be sent to worker processes.
+
+Usage:
+    from tweet_features import TweetFeaturizer
+    featurizer = TweetFeaturizer()  #nltk stopwords.words('english')
+    featurizer.bag('RT @user Loving #SpiderVerse :) https://t.co/x')  #{'love': True, 'spidervers': True}
+'''
+
+import re
+import string
+from functools import lru_cache
+
+FEATURIZER_VERSION = 1 #Change when the output of the featurizer changes
+
+#Emoticons of the notebook, extracted from http://blog.chapagain.com.np
+EMOTICONS_HAPPY = frozenset([
+    ':-)', ':)', ';)', ':o)', ':]', ':3', ':c)', ':>', '=]', '8)', '=)', ':}',
+    ':^)', ':-D', ':D', '8-D', '8D', 'x-D', 'xD', 'X-D', 'XD', '=-D', '=D',
+    '=-3', '=3', ':-))', ":'-)", ":')", ':*', ':^*', '>:P', ':-P', ':P', 'X-P',
+    'x-p', 'xp', 'XP', ':-p', ':p', '=p', ':-b', ':b', '>:)', '>;)', '>:-)',
+    '<3'
+    ])
+EMOTICONS_SAD = frozenset([
+    ':L', ':-/', '>:/', ':S', '>:[', ':@', ':-(', ':[', ':-||', '=L', ':<',
+    ':-[', ':-<', '=\\', '=/', '>:(', ':(', '>.<', ":'-(", ":'(", ':\\', ':-c',
+    ':c', ':{', '>:\\', ';('
+    ])
+EMOTICONS = EMOTICONS_HAPPY | EMOTICONS_SAD
+
+#Every substring of string.punctuation, the empty string included
+PUNCTUATION = frozenset(string.punctuation[i:j] for i in range(len(string.punctuation) + 1)
+                        for j in range(i, len(string.punctuation) + 1))
+
+TICKERS = re.compile(r'\$\w*') #Stock market tickers like $GE
+RETWEET = re.compile(r'^RT[\s]+') #Old style retweet text "RT"
+HYPERLINKS = re.compile(r'https?:\/\/.*[\r\n]*')
+HASHTAGS = re.compile(r'#') #Only the hash sign is removed, not the word
+
+
+class TweetFeaturizer():
+    '''Cleans, tokenizes and stems tweets into bags of words.'''
+
+    def __init__(self, stopwords=None, emoticons=EMOTICONS, cache_size=65536,
+                 preserve_case=False, strip_handles=True, reduce_len=True):
+        '''stopwords = words to remove (nltk stopwords.words('english') by default),
+        emoticons = emoticons to remove, cache_size = stems kept in the LRU cache,
+        preserve_case, strip_handles, reduce_len = TweetTokenizer options.'''
+        if stopwords is None:
+            from nltk.corpus import stopwords as nltk_stopwords
+            stopwords = nltk_stopwords.words('english')
+        self.stopwords = frozenset(stopwords)
+        self.emoticons = frozenset(emoticons)
+        self.removed = self.stopwords | self.emoticons | PUNCTUATION #One lookup per token
+        self.cache_size = cache_size
+        self.preserve_case = preserve_case
+        self.strip_handles = strip_handles
+        self.reduce_len = reduce_len
+        self._build()
+
+    def _build(self):
+        '''Creates the tokenizer, the stemmer and the stem cache.'''
+        from nltk.stem import PorterStemmer
+        from nltk.tokenize import TweetTokenizer
+        self.tokenizer = TweetTokenizer(preserve_case=self.preserve_case,
+                                        strip_handles=self.strip_handles, reduce_len=self.reduce_len)
+        self.stemmer = PorterStemmer()
+        self.stem = lru_cache(maxsize=self.cache_size)(self.stemmer.stem)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('tokenizer', 'stemmer', 'stem'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build()
+
+    def config(self):
+        '''Returns a JSON-serializable description of everything that changes
+        the output of the featurizer.'''
+        return {'version': FEATURIZER_VERSION,
+                'stopwords': sorted(self.stopwords),
+                'emoticons': sorted(self.emoticons),
+                'preserve_case': self.preserve_case,
+                'strip_handles': self.strip_handles,
+                'reduce_len': self.reduce_len}
+
+    def clean(self, tweet):
+        '''Removes tickers, retweet marks, hyperlinks and hash signs.'''
+        tweet = TICKERS.sub('', tweet)
+        tweet = RETWEET.sub('', tweet)
+        tweet = HYPERLINKS.sub('', tweet)
+        return HASHTAGS.sub('', tweet)
+
+    def tokens(self, tweet):
+        '''Same as cleanAndTokenizeTweets(): returns the list of stems of the
+        tweet without stopwords, emoticons and punctuation.'''
+        removed, stem = self.removed, self.stem
+        return [stem(word) for word in self.tokenizer.tokenize(self.clean(tweet))
+                if word not in removed]
+
+    def bag(self, tweet):
+        '''Same as bag_of_words(): returns {stem: True} for the stems of the tweet.'''
+        return dict.fromkeys(self.tokens(tweet), True)
+
+    def bags(self, tweets):
+        '''Returns the list of bags of words of a list of tweets.'''
+        return [self.bag(tweet) for tweet in tweets]
+
+    def cacheInfo(self):
+        '''Hits, misses and size of the stem cache.'''
+        return self.stem.cache_info()
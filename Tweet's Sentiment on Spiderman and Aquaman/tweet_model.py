@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Saved sentiment model with its featurizer, checksums and warm start.
+
+Every run of the notebook reads twitter_samples, featurizes the 10,000
+training tweets, shuffles them and trains the NaiveBayesClassifier before it
+can score anything. saveModel() writes the trained model to one file:
+
+- a first line of JSON with the format version, the sha256 of the training
+  corpus, the sha256 of the featurizer configuration and, for each section,
+  its offset, length and sha256;
+- the sections, each one pickled on its own: 'featurizer', 'scorer' (the
+  CompiledNB of nb_compiled.py) and 'classifier' (the NLTK classifier).
+
+A scoring job loads only the featurizer and the scorer, which takes
+milliseconds, and never unpickles the NLTK probability distributions.
+loadOrTrain() loads the file when it was made from the same corpus and
+featurizer configuration, and trains (and saves) a new model otherwise. The
+confusion matrix of the held out test tweets is kept in the header, so the
+precision and recall of the notebook don't need the test set again.
+
+Usage:
+    from tweet_model import loadOrTrain, loadModel
+    model = loadOrTrain('sentiment_model.bin')
+    model['scorer'].classifyTexts(tweets, model['featurizer'])
+    model['evaluation'].precision('pos')                #ConfusionCounter of the test tweets
+
+    python tweet_model.py sentiment_model.bin        #train if needed, then show the header
+'''
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import random
+
+FORMAT = 'tweet-sentiment-model'
+MODEL_VERSION = 1 #Change when the layout of the file changes
+TRAINING_FILES = ['positive_tweets.json', 'negative_tweets.json']
+TRAINING_LABELS = ['pos', 'neg']
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def corpusChecksum(fileids=TRAINING_FILES):
+    '''Returns the sha256 of the twitter_samples files used for training.'''
+    from nltk.corpus import twitter_samples
+    digest = hashlib.sha256()
+    for fileid in fileids:
+        with open(twitter_samples.abspath(fileid), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def featurizerChecksum(featurizer):
+    '''Returns the sha256 of the configuration of a TweetFeaturizer.'''
+    return sha256(json.dumps(featurizer.config(), sort_keys=True).encode('utf-8'))
+
+
+def trainTestSets(featurizer, test_size=1000, seed=None):
+    '''Same split as the notebook: the bags of words of the positive and
+    negative tweets are shuffled and the first test_size of each label go to
+    the test set. seed = random seed (a different split each time by default).
+    Returns (train_set, test_set).'''
+    from nltk.corpus import twitter_samples
+    rng = random.Random(seed)
+    train_set, test_set = [], []
+    for fileid, label in zip(TRAINING_FILES, TRAINING_LABELS):
+        labeled = [(featurizer.bag(tweet), label) for tweet in twitter_samples.strings(fileid)]
+        rng.shuffle(labeled)
+        test_set += labeled[:test_size]
+        train_set += labeled[test_size:]
+    return train_set, test_set
+
+
+def trainModel(featurizer=None, test_size=1000, seed=None):
+    '''Trains the NaiveBayesClassifier. Returns (classifier, featurizer, test_set).'''
+    from nltk import NaiveBayesClassifier
+    if featurizer is None:
+        from tweet_features import TweetFeaturizer
+        featurizer = TweetFeaturizer()
+    train_set, test_set = trainTestSets(featurizer, test_size, seed)
+    return NaiveBayesClassifier.train(train_set), featurizer, test_set
+
+
+def saveModel(path, classifier, featurizer, corpus_sha256=None, **info):
+    '''Writes the model file (replaced atomically). corpus_sha256 = checksum
+    of the training corpus (computed by default), info = more header values.
+    Returns the header.'''
+    from nb_compiled import CompiledNB
+    sections = {'featurizer': featurizer, 'scorer': CompiledNB(classifier), 'classifier': classifier}
+    payloads = {name: pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL) for name, obj in sections.items()}
+    header = dict(info, format=FORMAT, version=MODEL_VERSION,
+                  corpus_sha256=corpus_sha256 or corpusChecksum(),
+                  featurizer_sha256=featurizerChecksum(featurizer),
+                  labels=sorted(classifier.labels()), sections={})
+    offset = 0
+    for name, payload in payloads.items():
+        header['sections'][name] = [offset, len(payload), sha256(payload)]
+        offset += len(payload)
+
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as f:
+        f.write(json.dumps(header, sort_keys=True).encode('utf-8') + b'\n')
+        for payload in payloads.values():
+            f.write(payload)
+    os.replace(temporary, path)
+    return header
+
+
+def readHeader(path):
+    '''Returns the header of a model file, or None when the file isn't a model
+    of this version.'''
+    try:
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(header, dict) or header.get('format') != FORMAT or header.get('version') != MODEL_VERSION:
+        return None
+    return header
+
+
+def loadModel(path, sections=('featurizer', 'scorer'), verify=True):
+    '''path = model file, sections = parts to unpickle (add 'classifier' for
+    the NLTK classifier), verify = check the sha256 of each section.
+    Returns a dict with the header, the sections and, when the header has one,
+    the ConfusionCounter of the test tweets ('evaluation').'''
+    header = readHeader(path)
+    if header is None:
+        raise ValueError('{0} is not a {1} file of version {2}'.format(path, FORMAT, MODEL_VERSION))
+    model = {'header': header}
+    with open(path, 'rb') as f:
+        start = len(f.readline())
+        for name in sections:
+            offset, length, checksum = header['sections'][name]
+            f.seek(start + offset)
+            payload = f.read(length)
+            if verify and sha256(payload) != checksum:
+                raise ValueError('Checksum mismatch in section {0!r} of {1}'.format(name, path))
+            model[name] = pickle.loads(payload)
+    if 'evaluation' in header:
+        from tweet_eval import ConfusionCounter
+        model['evaluation'] = ConfusionCounter.fromDict(header['evaluation'])
+    return model
+
+
+def loadOrTrain(path, featurizer=None, sections=('featurizer', 'scorer'), test_size=1000, seed=0):
+    '''Loads the model at path when it was trained on the current corpus with
+    the same featurizer configuration (the default TweetFeaturizer when
+    featurizer is None). Otherwise trains a new model, scores its test set
+    and saves both to path. Returns the same dict as loadModel().'''
+    if featurizer is None:
+        from tweet_features import TweetFeaturizer
+        featurizer = TweetFeaturizer()
+    corpus = corpusChecksum()
+    header = readHeader(path)
+    if (header is None or header['corpus_sha256'] != corpus or 'evaluation' not in header
+            or header['featurizer_sha256'] != featurizerChecksum(featurizer)):
+        from tweet_eval import evaluate
+        classifier, featurizer, test_set = trainModel(featurizer, test_size, seed)
+        counter = evaluate(classifier.classify_many, test_set)
+        saveModel(path, classifier, featurizer, corpus, test_size=test_size, seed=seed,
+                  train_size=classifier._label_probdist.freqdist().N(),
+                  evaluation=counter.toDict())
+    return loadModel(path, sections)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train (when needed) and save the tweet sentiment model')
+    parser.add_argument('path', help='model file')
+    parser.add_argument('--test-size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    model = loadOrTrain(args.path, test_size=args.test_size, seed=args.seed)
+    header = dict(model['header'])
+    header['sections'] = {name: '{0:,} bytes'.format(s[1]) for name, s in header['sections'].items()}
+    print(json.dumps(header, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
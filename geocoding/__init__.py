@@ -0,0 +1,4 @@
+'''Geocoding shared by the projects of the repository (see client.py).'''
+
+from .client import AsyncGeocoder, GeocodingError, TokenBucket, countryFetch, reverseGeocode
+from .stub_server import StubServer
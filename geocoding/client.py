@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Asynchronous, rate-limited geocoding client for Nominatim-like services.
+
+The Rents map and the NYC schools notebook both geocoded one item at a time in
+a blocking loop (requests.get per country, RateLimiter(geolocator.reverse)
+per school). AsyncGeocoder keeps one aiohttp session (a pool of connections),
+lets up to 'concurrency' requests be in flight at once, spaces the requests
+with a token bucket so the rate allowed by the provider is never exceeded,
+retries failed requests with exponential backoff and sends a single request
+for identical queries that are in flight at the same time.
+
+The public Nominatim server allows one request per second, which is the
+default. A self-hosted server (or the stub of stub_server.py) can take a
+higher rate and concurrency.
+
+Usage:
+    from geocoding import countryFetch, reverseGeocode
+    locations = countryFetch(['Canada', 'Norway'])          #[(lat, lon), ...]
+    places = reverseGeocode([(40.7614, -73.9880)], rate=1)   #[(address, (lat, lon)), ...]
+'''
+
+import asyncio
+import time
+
+import aiohttp
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org'
+USER_AGENT = 'my-projects-geocoding/1.0'
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class GeocodingError(Exception):
+    '''A request still failed after every retry.'''
+
+
+class TokenBucket():
+    '''Allows 'rate' acquisitions per second on average, with bursts of up to
+    'burst' acquisitions.'''
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        '''Waits until a token is available and takes it.'''
+        async with self.lock: #Waiters are served in order
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def _gatherAll(aws):
+    '''Runs the awaitables together and returns their results in order. When
+    some fail, every one is still awaited to the end (no request is left
+    running on its own) and the first error is raised.'''
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+class AsyncGeocoder():
+    '''Concurrent geocoding client, used as an async context manager.'''
+
+    def __init__(self, base_url=NOMINATIM_URL, concurrency=2, rate=1.0, burst=1, retries=3,
+                 backoff=0.5, timeout=30, user_agent=USER_AGENT):
+        '''base_url = root url of the service (with /search and /reverse),
+        concurrency = requests in flight at once, rate = requests per second,
+        burst = requests allowed back to back, retries = new attempts after a
+        failure, backoff = first wait between attempts in seconds (doubled
+        each time), timeout = seconds per request, user_agent = required by Nominatim.'''
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.user_agent = user_agent
+        self.session = None
+        self.semaphore = None
+        self.in_flight = {} #(path, params) -> task of the request being made
+        self.requests = 0 #Requests actually sent, retries included
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout,
+                                             headers={'User-Agent': self.user_agent})
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        self.session = None
+
+    async def _request(self, path, params):
+        '''Sends one GET request with retries. Returns the decoded JSON.'''
+        url = self.base_url + path
+        for attempt in range(self.retries + 1):
+            wait = self.backoff * 2 ** attempt
+            async with self.semaphore:
+                await self.bucket.acquire()
+                self.requests += 1
+                try:
+                    async with self.session.get(url, params=params) as response:
+                        if response.status not in RETRY_STATUS:
+                            response.raise_for_status()
+                            return await response.json(content_type=None)
+                        retry_after = response.headers.get('Retry-After', '')
+                        if retry_after.isdigit():
+                            wait = max(wait, float(retry_after))
+                        error = 'HTTP {0}'.format(response.status)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    error = repr(e)
+            if attempt < self.retries:
+                await asyncio.sleep(wait) #Outside the semaphore, other requests go on
+        raise GeocodingError('{0} {1}: {2}'.format(url, params, error))
+
+    async def get(self, path, **params):
+        '''GET path with params. Identical requests in flight share one result.'''
+        params = {k: str(v) for k, v in params.items()}
+        key = (path, tuple(sorted(params.items())))
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._request(path, params))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def country(self, name):
+        '''Returns the (lat, lon) of a country, or None when it isn't found.'''
+        found = await self.get('/search', country=name, format='json', limit=1)
+        return (float(found[0]['lat']), float(found[0]['lon'])) if found else None
+
+    async def reverse(self, lat, lon):
+        '''Returns (address, (lat, lon)) of the place at a coordinate, like the
+        geopy Location that geolocator.reverse() gives, or None when nothing is found.'''
+        found = await self.get('/reverse', lat=lat, lon=lon, format='json')
+        if not found or 'error' in found:
+            return None
+        return found['display_name'], (float(found['lat']), float(found['lon']))
+
+    async def countries(self, names):
+        '''Returns the locations of a list of countries, in the same order.'''
+        return await _gatherAll([self.country(n) for n in names])
+
+    async def reverseMany(self, coordinates):
+        '''coordinates = list of (lat, lon). Returns the places in the same order.'''
+        return await _gatherAll([self.reverse(lat, lon) for lat, lon in coordinates])
+
+
+def _run(method, items, kwargs):
+    async def run():
+        async with AsyncGeocoder(**kwargs) as geocoder:
+            return await getattr(geocoder, method)(items)
+    return asyncio.run(run())
+
+
+def countryFetch(names, **kwargs):
+    '''Blocking helper: returns a list with the (lat, lon) of each country, or
+    None. Fits the fetch argument of CountryGeocoder. kwargs go to AsyncGeocoder.'''
+    return list(_run('countries', list(names), kwargs))
+
+
+def reverseGeocode(coordinates, **kwargs):
+    '''Blocking helper: coordinates = list of (lat, lon) or of 'lat,lon' strings.
+    Returns a list of (address, (lat, lon)). kwargs go to AsyncGeocoder.'''
+    coordinates = [tuple(float(v) for v in c.split(',')) if isinstance(c, str) else tuple(c)
+                   for c in coordinates]
+    return list(_run('reverseMany', coordinates, kwargs))
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''Local stand-in for the Nominatim /search and /reverse endpoints.
+
+Lets the geocoding code run offline: StubServer answers from a dictionary of
+places in a background thread, can fail the first requests (to exercise the
+retries), can be slow (to see the concurrency) and counts the requests it
+gets (to check the rate limit and the deduplication).
+
+Usage:
+    from geocoding import StubServer, countryFetch
+    with StubServer({'Canada': (60.0, -95.0)}, fail_first=2, delay=0.2) as server:
+        locations = countryFetch(['Canada'] * 5, base_url=server.url, rate=20, concurrency=4)
+
+    python -m geocoding.stub_server --port 8080
+'''
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SAMPLE_PLACES = {
+    'Canada': (60.0, -95.0),
+    'Norway': (62.0, 10.0),
+    'Denmark': (56.0, 10.0),
+    "Hell's Kitchen": (40.7614, -73.9880),
+}
+
+
+class StubServer():
+    '''Threaded HTTP server answering like Nominatim, used as a context manager.'''
+
+    def __init__(self, places=None, port=0, fail_first=0, delay=0.0):
+        '''places = dict {name: (lat, lon)}, port = 0 picks a free port,
+        fail_first = number of requests answered with 503,
+        delay = seconds to wait before each answer.'''
+        self.places = dict(SAMPLE_PLACES if places is None else places)
+        self.fail_first = fail_first
+        self.delay = delay
+        self.requests = [] #(time, path, params) of every request
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self.server.server_address[1])
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub.lock:
+                    stub.requests.append((time.monotonic(), url.path, params))
+                    failing = len(stub.requests) <= stub.fail_first
+                time.sleep(stub.delay)
+                if failing:
+                    return self._send(503, {'error': 'try again'})
+                if url.path == '/search':
+                    return self._send(200, stub.search(params.get('country') or params.get('q', '')))
+                if url.path == '/reverse':
+                    return self._send(200, stub.reverse(float(params['lat']), float(params['lon'])))
+                self._send(404, {'error': 'not found'})
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def search(self, name):
+        '''Answer of /search: a list with the place, empty when unknown.'''
+        for place, (lat, lon) in self.places.items():
+            if place.casefold() == name.strip().casefold():
+                return [{'display_name': place, 'lat': str(lat), 'lon': str(lon)}]
+        return []
+
+    def reverse(self, lat, lon):
+        '''Answer of /reverse: the closest place.'''
+        if not self.places:
+            return {'error': 'Unable to geocode'}
+        place = min(self.places, key=lambda p: (self.places[p][0] - lat) ** 2 + (self.places[p][1] - lon) ** 2)
+        return {'display_name': '{0}, {0}, New York, United States'.format(place),
+                'lat': str(self.places[place][0]), 'lon': str(self.places[place][1])}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in for the Nominatim API')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--places', default=None, help='JSON file {name: [lat, lon]}')
+    parser.add_argument('--fail-first', type=int, default=0)
+    parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    places = None
+    if args.places:
+        with open(args.places) as f:
+            places = json.load(f)
+    server = StubServer(places, args.port, args.fail_first, args.delay)
+    print('Serving on', server.url)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
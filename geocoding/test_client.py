@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+'''The geocoding client against the local stub: deduplication, rate limit,
+retries and the GeocodingError raised once every request is done.
+
+    python -m pytest geocoding
+'''
+
+import pytest
+
+from geocoding import GeocodingError, StubServer, countryFetch, reverseGeocode
+
+
+def test_identical_queries_share_one_request():
+    with StubServer(delay=0.2) as server:
+        locations = countryFetch(['Canada'] * 5 + ['Norway', 'Atlantis'],
+                                 base_url=server.url, rate=50, concurrency=4)
+    assert locations == [(60.0, -95.0)] * 5 + [(62.0, 10.0), None]
+    assert len(server.requests) == 3
+
+
+def test_rate_limit_spaces_the_requests():
+    coordinates = [(40.0 + i, -73.0) for i in range(6)]
+    with StubServer() as server:
+        places = reverseGeocode(coordinates, base_url=server.url, rate=10, concurrency=4)
+    assert len(places) == 6
+    times = sorted(t for t, _, _ in server.requests)
+    assert times[-1] - times[0] >= 5 / 10 * 0.9
+
+
+def test_retries_then_error_after_every_request():
+    with StubServer(fail_first=2) as server:
+        assert countryFetch(['Denmark'], base_url=server.url, rate=50, backoff=0.01) == [(56.0, 10.0)]
+    assert len(server.requests) == 3
+
+    with StubServer(fail_first=100) as server:
+        with pytest.raises(GeocodingError):
+            countryFetch(['Canada', 'Norway', 'Denmark'], base_url=server.url, rate=50,
+                         concurrency=3, retries=1, backoff=0.05)
+        #Every query made its two attempts before the error was raised
+        assert len(server.requests) == 6